@@ -1,316 +1,3511 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, g, Response, stream_with_context, has_request_context
 from flask_cors import CORS
+import argparse
+import asyncio
+import atexit
+import base64
+import bisect
+import concurrent.futures
+import cProfile
+import copy
+import csv
+import functools
+import gzip
 import hashlib
+import heapq
+import hmac
+import html
+import importlib
+import io
+import ipaddress
+import itertools
 import json
+import math
+import multiprocessing
+import pstats
+import queue
+import re
+import secrets
+import signal
+import socket
 import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 import jwt
 import os
 
+class LazyModule:
+    """Stand-in for a heavy module: imports it on first attribute access and
+    rebinds its global name to the real module, so later lookups are direct."""
+
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+np = LazyModule('numpy', 'np')
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-CORS(app)
+app.config['DATABASE'] = os.environ.get('IMPACTMATCH_DB', 'impactmatch.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('IMPACTMATCH_DB_POOL_SIZE', 8))
+app.config['DB_BUSY_TIMEOUT'] = 5.0
+app.config['DB_MMAP_SIZE'] = 64 * 1024 * 1024
+app.config['RESPONSE_CACHE_BYTES'] = 32 * 1024 * 1024
+app.config['RESPONSE_CACHE_TTL'] = 300
+app.config['STATS_RECONCILE_INTERVAL'] = 3600
+app.config['AI_PROVIDER'] = os.environ.get('AI_PROVIDER', 'rules')
+app.config['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY', '')
+app.config['OPENAI_API_BASE'] = os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+app.config['AI_MODEL'] = os.environ.get('AI_MODEL', 'gpt-3.5-turbo')
+app.config['AI_TIMEOUT'] = float(os.environ.get('AI_TIMEOUT', 8))
+app.config['AI_CONCURRENCY'] = int(os.environ.get('AI_CONCURRENCY', 4))
+app.config['AI_BATCH_SIZE'] = int(os.environ.get('AI_BATCH_SIZE', 8))
+app.config['AI_BATCH_WINDOW'] = float(os.environ.get('AI_BATCH_WINDOW', 0.05))
+app.config['AI_CACHE_SIZE'] = 1024
+app.config['BULK_CHUNK_SIZE'] = 500
+app.config['BULK_MAX_ERRORS'] = 1000
+app.config['PASSWORD_SCRYPT_N'] = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+app.config['PASSWORD_SCRYPT_R'] = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+app.config['PASSWORD_SCRYPT_P'] = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = 64
+app.config['TOKEN_CACHE_SIZE'] = 10000
+app.config['EVENT_QUEUE_SIZE'] = 256
+app.config['EVENT_POLL_INTERVAL'] = 0.5
+app.config['EVENT_KEEPALIVE'] = 15
+app.config['EVENT_RETENTION'] = 10000
+app.config['EVENT_REPLAY_LIMIT'] = 1000
+app.config['EVENT_MAX_MISSIONS'] = 50
+app.config['STREAM_TICKET_TTL'] = 60
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('IMPACTMATCH_SLOW_QUERY_MS', 100))
+app.config['SLOW_QUERY_LOG_SIZE'] = 200
+app.config['DB_PROGRESS_STEPS'] = 1000
+app.config['PROFILE_SAMPLE_RATE'] = int(os.environ.get('IMPACTMATCH_PROFILE_EVERY', 0))
+app.config['PROFILE_SECRET'] = os.environ.get('IMPACTMATCH_PROFILE_SECRET')
+app.config['PROFILE_KEEP'] = 20
+app.config['METRICS_TOKEN'] = os.environ.get('IMPACTMATCH_METRICS_TOKEN')
+app.config['GAZETTEER_PATH'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+app.config['STATIC_ROOT'] = os.path.dirname(os.path.abspath(__file__))
+app.config['NEAR_MAX_RADIUS_KM'] = 500
+app.config['RULES_LEGACY_MATCHING'] = os.environ.get('IMPACTMATCH_RULES_LEGACY', '1') != '0'
+app.config['CANDIDATES_PER_MISSION'] = 5
+app.config['JOB_WORKERS'] = int(os.environ.get('IMPACTMATCH_JOB_WORKERS', 2))
+app.config['JOB_POLL_INTERVAL'] = 0.5
+app.config['JOB_LEASE'] = 120
+app.config['JOB_MAX_ATTEMPTS'] = 3
+app.config['JOB_RETRY_DELAY'] = 2.0
+app.config['JOB_RETENTION'] = 24 * 3600
+app.config['JOB_MAX_WAIT'] = 25
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Next-Offset', 'Location'])
+
+# ============= METRICS =============
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (n, _label_value(v)) for n, v in zip(names, values))
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s counter' % self.name]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append('%s%s %r' % (self.name, _labels(self.labels, labels), value))
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        names = self.labels + ('le',)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append('%s_bucket%s %d' % (self.name, _labels(names, labels + (bound,)), cumulative))
+                lines.append('%s_bucket%s %d' % (self.name, _labels(names, labels + ('+Inf',)), count))
+                lines.append('%s_sum%s %r' % (self.name, _labels(self.labels, labels), total))
+                lines.append('%s_count%s %d' % (self.name, _labels(self.labels, labels), count))
+        return lines
+
+request_seconds = Histogram(
+    'impactmatch_http_request_duration_seconds', 'Time to produce a response, by route.',
+    LATENCY_BUCKETS, ('method', 'route', 'status'))
+request_queries = Histogram(
+    'impactmatch_http_request_queries', 'SQL statements executed per request, by route.',
+    QUERY_COUNT_BUCKETS, ('route',))
+request_db_seconds = Counter(
+    'impactmatch_http_request_db_seconds_total', 'Time spent in SQLite, by route.', ('route',))
+request_vm_steps = Counter(
+    'impactmatch_http_request_db_vm_steps_total', 'Approximate SQLite VM instructions, by route.', ('route',))
+statement_seconds = Counter(
+    'impactmatch_db_statement_seconds_total', 'Time spent per normalized SQL statement.', ('statement',))
+statement_calls = Counter(
+    'impactmatch_db_statement_calls_total', 'Executions per normalized SQL statement.', ('statement',))
+slow_queries = Counter(
+    'impactmatch_db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('route',))
+job_seconds = Histogram(
+    'impactmatch_job_duration_seconds', 'Time to run a background job, by kind and outcome.',
+    LATENCY_BUCKETS, ('kind', 'status'))
+
+slow_query_log = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+_request_metrics = threading.local()
+# Tooling hook called as (route, sql, params, many) for every statement;
+# bench.py --check-plans uses it to EXPLAIN what each route runs
+query_observer = None
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse whitespace and placeholder lists so IN (?, ?, ...) queries of
+    any length share one label."""
+    sql = ' '.join(sql.split())
+    sql = re.sub(r'\(\?(?:, ?\?)*\)(?:, ?\(\?(?:, ?\?)*\))+', '(?), ...', sql)
+    sql = re.sub(r'\?(?:, ?\?)+', '?, ...', sql)
+    return sql[:200]
+
+def record_query(sql, seconds):
+    """Charge time to a statement label and to the current request."""
+    statement_seconds.inc((normalize_sql(sql),), seconds)
+    current = getattr(_request_metrics, 'current', None)
+    if current is not None:
+        current['db_seconds'] += seconds
+
+def log_slow_query(sql, seconds):
+    current = getattr(_request_metrics, 'current', None)
+    route = current['route'] if current is not None else '-'
+    slow_queries.inc((route,))
+    slow_query_log.append({
+        'at': datetime.utcnow().isoformat() + 'Z',
+        'route': route,
+        'ms': round(seconds * 1000, 3),
+        'sql': normalize_sql(sql)
+    })
+    app.logger.warning('Slow query (%.1fms) in %s: %s', seconds * 1000, route, normalize_sql(sql))
+
+def count_vm_steps():
+    current = getattr(_request_metrics, 'current', None)
+    if current is not None:
+        current['vm_steps'] += app.config['DB_PROGRESS_STEPS']
+    return 0
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times its statement, including the row fetches that do
+    most of the work of a SELECT."""
+
+    def run(self, method, sql, params):
+        self._sql = sql
+        self._elapsed = 0.0
+        self._logged = False
+        current = getattr(_request_metrics, 'current', None)
+        if current is not None:
+            current['queries'] += 1
+        statement_calls.inc((normalize_sql(sql),))
+        if query_observer is not None:
+            if method is sqlite3.Cursor.executemany:
+                params = list(params)
+            query_observer(current['route'] if current is not None else None, sql, params,
+                           method is sqlite3.Cursor.executemany)
+        return self._timed(method, sql, params)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._elapsed += elapsed
+            record_query(self._sql, elapsed)
+            # Logged once, when the statement's cumulative time crosses the threshold
+            if not self._logged and self._elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+                self._logged = True
+                log_slow_query(self._sql, self._elapsed)
+
+    def fetchone(self):
+        return self._timed(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        return self._timed(sqlite3.Cursor.__next__)
+
+class InstrumentedConnection(sqlite3.Connection):
+    def execute(self, sql, params=()):
+        cursor = self.cursor(InstrumentedCursor)
+        return cursor.run(sqlite3.Cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        cursor = self.cursor(InstrumentedCursor)
+        return cursor.run(sqlite3.Cursor.executemany, sql, params)
+
+class SamplingProfiler:
+    """cProfile on 1 in `every` requests, or on requests whose X-Profile
+    header matches `secret`. One request is profiled at a time."""
+
+    def __init__(self, every, secret, keep):
+        self.every = every
+        self.secret = secret
+        self.profiles = deque(maxlen=keep)
+        self._seen = itertools.count(1)
+        self._busy = threading.Lock()
+
+    def start(self, headers):
+        header = headers.get('X-Profile', '')
+        wanted = bool(self.secret and hmac.compare_digest(header.encode(), self.secret.encode()))
+        if not wanted and self.every:
+            wanted = next(self._seen) % self.every == 0
+        if not wanted or not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, say) owns the hook
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, route, seconds):
+        profile.disable()
+        self._busy.release()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(30)
+        self.profiles.append({
+            'at': datetime.utcnow().isoformat() + 'Z',
+            'route': route,
+            'ms': round(seconds * 1000, 3),
+            'stats': out.getvalue()
+        })
+
+profiler = SamplingProfiler(
+    app.config['PROFILE_SAMPLE_RATE'],
+    app.config['PROFILE_SECRET'],
+    app.config['PROFILE_KEEP']
+)
+
+@app.before_request
+def start_request_metrics():
+    rule = request.url_rule
+    _request_metrics.current = {
+        'route': rule.rule if rule is not None else 'unmatched',
+        'started': time.perf_counter(),
+        'status': '500',
+        'queries': 0,
+        'db_seconds': 0.0,
+        'vm_steps': 0
+    }
+    g._profile = profiler.start(request.headers)
+
+@app.after_request
+def add_server_timing(response):
+    current = getattr(_request_metrics, 'current', None)
+    if current is not None:
+        current['status'] = str(response.status_code)
+        response.headers['Server-Timing'] = 'db;dur=%.2f;desc="%d queries", app;dur=%.2f' % (
+            current['db_seconds'] * 1000, current['queries'],
+            (time.perf_counter() - current['started']) * 1000)
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    # Runs after streamed bodies that keep the request context are consumed
+    current = _request_metrics.__dict__.pop('current', None)
+    if current is None:
+        return
+    elapsed = time.perf_counter() - current['started']
+    route = current['route']
+    request_seconds.observe((request.method, route, current['status']), elapsed)
+    request_queries.observe((route,), current['queries'])
+    request_db_seconds.inc((route,), current['db_seconds'])
+    if current['vm_steps']:
+        request_vm_steps.inc((route,), current['vm_steps'])
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        profiler.finish(profile, route, elapsed)
+
+METRICS = [
+    request_seconds, request_queries, request_db_seconds, request_vm_steps,
+    statement_seconds, statement_calls, slow_queries, job_seconds
+]
+
+def render_gauges(prefix, stats):
+    """Flatten a component's stats() dict into untyped Prometheus samples."""
+    lines = []
+    for key, value in sorted(stats.items()):
+        name = '%s_%s' % (prefix, re.sub(r'[^a-zA-Z0-9_]', '_', key))
+        if isinstance(value, dict):
+            lines.extend(render_gauges(name, value))
+        elif isinstance(value, (bool, int, float)):
+            lines.append('%s %r' % (name, float(value)))
+    return lines
 
 # Database setup
+class ConnectionPool:
+    """Bounded pool of pre-configured SQLite connections shared by worker threads.
+
+    Connections are opened once with WAL journaling so readers never queue
+    behind a writer, and are handed out LIFO so the warmest connection (and
+    its prepared statement cache) is reused first.
+    """
+
+    def __init__(self, path, size=8, busy_timeout=5.0, mmap_size=0, cached_statements=256,
+                 progress_steps=0):
+        self.path = path
+        self.progress_steps = progress_steps
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {'hits': 0, 'misses': 0, 'waits': 0, 'wait_ms': 0.0}
+
+    def _connect(self):
+        db = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=InstrumentedConnection
+        )
+        db.row_factory = sqlite3.Row
+        if self.progress_steps:
+            db.set_progress_handler(count_vm_steps, self.progress_steps)
+        db.create_function('haversine_km', 4, sql_haversine_km, deterministic=True)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('PRAGMA busy_timeout=%d' % int(self.busy_timeout * 1000))
+        db.execute('PRAGMA mmap_size=%d' % self.mmap_size)
+        db.execute('PRAGMA temp_store=MEMORY')
+        return db
+
+    def acquire(self):
+        try:
+            db = self._idle.get_nowait()
+            with self._lock:
+                self._stats['hits'] += 1
+            return db
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                self._stats['misses'] += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool exhausted: wait for another request to hand a connection back
+        started = time.perf_counter()
+        try:
+            db = self._idle.get(timeout=self.busy_timeout)
+        except queue.Empty:
+            raise RuntimeError('Database connection pool exhausted')
+        with self._lock:
+            self._stats['waits'] += 1
+            self._stats['wait_ms'] += (time.perf_counter() - started) * 1000
+        return db
+
+    def release(self, db):
+        if db.in_transaction:
+            db.rollback()
+        self._idle.put(db)
+
+    def close_all(self):
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            db.close()
+            with self._lock:
+                self._created -= 1
+
+    def forget(self):
+        """Drop connections inherited across a fork without closing them;
+        they belong to the parent process."""
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['size'] = self.size
+        stats['wait_ms'] = round(stats['wait_ms'], 3)
+        return stats
+
+def make_db_pool(config):
+    return ConnectionPool(
+        config['DATABASE'],
+        size=config['DB_POOL_SIZE'],
+        busy_timeout=config['DB_BUSY_TIMEOUT'],
+        mmap_size=config['DB_MMAP_SIZE'],
+        progress_steps=config['DB_PROGRESS_STEPS']
+    )
+
+db_pool = make_db_pool(app.config)
+atexit.register(lambda: db_pool.close_all())
+os.register_at_fork(after_in_child=lambda: db_pool.forget())
+
 def get_db():
-    db = sqlite3.connect('impactmatch.db')
-    db.row_factory = sqlite3.Row
-    return db
+    """Return the connection bound to the current app context, checking one
+    out of the pool on first use. It goes back to the pool on teardown."""
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
 
-def init_db():
-    with get_db() as db:
-        # Create users table
+@app.teardown_appcontext
+def release_db(exc):
+    db = g.pop('db', None)
+    if db is not None:
+        db_pool.release(db)
+
+# ============= MIGRATIONS =============
+def migrate_baseline(db):
+    """Schema as it stood before versioned migrations. Every step is
+    idempotent, so databases created by any earlier release converge.
+
+    Like every migration it only runs SQL frozen here: the columns computed
+    by app code (features, mission_terms, people_reached) are filled in by
+    refresh_derived_data() once the migrations are applied."""
+    # Create users table
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            user_type TEXT NOT NULL,
+            name TEXT,
+            city TEXT,
+            age INTEGER,
+            job TEXT,
+            skills TEXT,
+            user_values TEXT,
+            availability TEXT,
+            profile_score INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create associations table
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS associations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE,
+            name TEXT,
+            description TEXT,
+            logo TEXT,
+            verified BOOLEAN DEFAULT 0,
+            impact_score REAL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Create missions table
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS missions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            association_id INTEGER,
+            title TEXT,
+            emoji TEXT,
+            description TEXT,
+            impact_description TEXT,
+            location TEXT,
+            commitment TEXT,
+            skills_required TEXT,
+            tags TEXT,
+            urgent BOOLEAN DEFAULT 0,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (association_id) REFERENCES associations (id)
+        )
+    ''')
+
+    # Create matches table
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS matches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mission_id INTEGER,
+            user_id INTEGER,
+            score INTEGER,
+            status TEXT DEFAULT 'pending',
+            ai_insights TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (mission_id) REFERENCES missions (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Feature vectors used by the matching engine, computed on write
+    columns = [c['name'] for c in db.execute('PRAGMA table_info(missions)')]
+    if 'features' not in columns:
+        db.execute('ALTER TABLE missions ADD COLUMN features TEXT')
+
+    # Catalog version bumped by every write, used for response caching
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            modified_at INTEGER NOT NULL
+        )
+    ''')
+    db.execute(
+        "INSERT OR IGNORE INTO data_versions (name, version, modified_at) VALUES ('catalog', 0, ?)",
+        (int(time.time()),)
+    )
+
+    # Keyset pagination over the active catalog
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_missions_status_created
+        ON missions (status, created_at DESC, id DESC)
+    ''')
+
+    # Inverted index of normalized skill/value/city terms for filtering
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS mission_terms (
+            kind TEXT NOT NULL,
+            term TEXT NOT NULL,
+            mission_id INTEGER NOT NULL,
+            PRIMARY KEY (kind, term, mission_id),
+            FOREIGN KEY (mission_id) REFERENCES missions (id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Per-association dashboard counters, kept current by triggers
+    if 'people_reached' not in columns:
+        db.execute('ALTER TABLE missions ADD COLUMN people_reached INTEGER DEFAULT 0')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS association_stats (
+            association_id INTEGER PRIMARY KEY,
+            active_missions INTEGER NOT NULL DEFAULT 0,
+            people_impacted INTEGER NOT NULL DEFAULT 0,
+            total_candidates INTEGER NOT NULL DEFAULT 0,
+            new_candidates INTEGER NOT NULL DEFAULT 0,
+            accepted_candidates INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (association_id) REFERENCES associations (id)
+        )
+    ''')
+    for trigger in [
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_association_insert
+        AFTER INSERT ON associations
+        BEGIN
+            INSERT OR IGNORE INTO association_stats (association_id) VALUES (NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_mission_insert
+        AFTER INSERT ON missions
+        BEGIN
+            INSERT OR IGNORE INTO association_stats (association_id) VALUES (NEW.association_id);
+            UPDATE association_stats SET
+                active_missions = active_missions + (NEW.status = 'active'),
+                people_impacted = people_impacted
+                    + CASE WHEN NEW.status = 'active' THEN IFNULL(NEW.people_reached, 0) ELSE 0 END
+            WHERE association_id = NEW.association_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_mission_update
+        AFTER UPDATE OF status, people_reached, association_id ON missions
+        BEGIN
+            UPDATE association_stats SET
+                active_missions = active_missions - (OLD.status = 'active'),
+                people_impacted = people_impacted
+                    - CASE WHEN OLD.status = 'active' THEN IFNULL(OLD.people_reached, 0) ELSE 0 END
+            WHERE association_id = OLD.association_id;
+            INSERT OR IGNORE INTO association_stats (association_id) VALUES (NEW.association_id);
+            UPDATE association_stats SET
+                active_missions = active_missions + (NEW.status = 'active'),
+                people_impacted = people_impacted
+                    + CASE WHEN NEW.status = 'active' THEN IFNULL(NEW.people_reached, 0) ELSE 0 END
+            WHERE association_id = NEW.association_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_mission_delete
+        AFTER DELETE ON missions
+        BEGIN
+            UPDATE association_stats SET
+                active_missions = active_missions - (OLD.status = 'active'),
+                people_impacted = people_impacted
+                    - CASE WHEN OLD.status = 'active' THEN IFNULL(OLD.people_reached, 0) ELSE 0 END
+            WHERE association_id = OLD.association_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_match_insert
+        AFTER INSERT ON matches
+        BEGIN
+            UPDATE association_stats SET
+                total_candidates = total_candidates + 1,
+                new_candidates = new_candidates + (NEW.status = 'pending'),
+                accepted_candidates = accepted_candidates + (NEW.status = 'accepted')
+            WHERE association_id = (SELECT association_id FROM missions WHERE id = NEW.mission_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_match_update
+        AFTER UPDATE OF status ON matches
+        BEGIN
+            UPDATE association_stats SET
+                new_candidates = new_candidates - (OLD.status = 'pending') + (NEW.status = 'pending'),
+                accepted_candidates = accepted_candidates
+                    - (OLD.status = 'accepted') + (NEW.status = 'accepted')
+            WHERE association_id = (SELECT association_id FROM missions WHERE id = NEW.mission_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_match_delete
+        AFTER DELETE ON matches
+        BEGIN
+            UPDATE association_stats SET
+                total_candidates = total_candidates - 1,
+                new_candidates = new_candidates - (OLD.status = 'pending'),
+                accepted_candidates = accepted_candidates - (OLD.status = 'accepted')
+            WHERE association_id = (SELECT association_id FROM missions WHERE id = OLD.mission_id);
+        END
+        '''
+    ]:
+        db.execute(trigger)
+    db.execute('''
+        INSERT OR REPLACE INTO association_stats (
+            association_id, active_missions, people_impacted,
+            total_candidates, new_candidates, accepted_candidates
+        )
+        SELECT
+            a.id,
+            IFNULL(ms.active, 0),
+            IFNULL(ms.people, 0),
+            IFNULL(mt.total, 0),
+            IFNULL(mt.new, 0),
+            IFNULL(mt.accepted, 0)
+        FROM associations a
+        LEFT JOIN (
+            SELECT association_id,
+                   SUM(status = 'active') AS active,
+                   SUM(CASE WHEN status = 'active' THEN IFNULL(people_reached, 0) ELSE 0 END) AS people
+            FROM missions GROUP BY association_id
+        ) ms ON ms.association_id = a.id
+        LEFT JOIN (
+            SELECT m.association_id,
+                   COUNT(*) AS total,
+                   SUM(x.status = 'pending') AS new,
+                   SUM(x.status = 'accepted') AS accepted
+            FROM matches x JOIN missions m ON m.id = x.mission_id
+            GROUP BY m.association_id
+        ) mt ON mt.association_id = a.id
+    ''')
+
+    # Citizen profile revisions, so every worker can pick up changes
+    users_columns = [c['name'] for c in db.execute('PRAGMA table_info(users)')]
+    if 'profile_rev' not in users_columns:
+        db.execute('ALTER TABLE users ADD COLUMN profile_rev INTEGER DEFAULT 0')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_users_profile_rev ON users (profile_rev)')
+
+    # Change feed tailed by every worker for /api/stream; AUTOINCREMENT
+    # so ids stay monotonic after old events are pruned
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            audience TEXT,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def migrate_hot_indexes(db):
+    """Indexes behind the per-request lookups. associations.user_id needs
+    none: its UNIQUE constraint already has one."""
+    # Candidates and dashboards list an association's active missions
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_missions_association
+        ON missions (association_id, status, created_at DESC, id DESC)
+    ''')
+    # Candidate statuses are looked up by citizen, stats are grouped by mission
+    db.execute('CREATE INDEX IF NOT EXISTS idx_matches_user ON matches (user_id, mission_id, status)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_matches_mission ON matches (mission_id, status)')
+
+def migrate_mission_search(db):
+    """Full-text index over mission text for /api/missions/search. It is an
+    external-content FTS5 table: the text stays in missions, and triggers
+    keep the index in step with it."""
+    db.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS missions_fts USING fts5(
+            title, description, impact_description,
+            content='missions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS missions_fts_insert
+        AFTER INSERT ON missions
+        BEGIN
+            INSERT INTO missions_fts (rowid, title, description, impact_description)
+            VALUES (NEW.id, NEW.title, NEW.description, NEW.impact_description);
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS missions_fts_delete
+        AFTER DELETE ON missions
+        BEGIN
+            INSERT INTO missions_fts (missions_fts, rowid, title, description, impact_description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.impact_description);
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS missions_fts_update
+        AFTER UPDATE OF title, description, impact_description ON missions
+        BEGIN
+            INSERT INTO missions_fts (missions_fts, rowid, title, description, impact_description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.impact_description);
+            INSERT INTO missions_fts (rowid, title, description, impact_description)
+            VALUES (NEW.id, NEW.title, NEW.description, NEW.impact_description);
+        END
+    ''')
+    db.execute("INSERT INTO missions_fts (missions_fts) VALUES ('rebuild')")
+
+def migrate_geo(db):
+    """Coordinates resolved from the gazetteer, a remote flag, and an
+    R*Tree over mission coordinates for radius queries. Triggers keep the
+    R*Tree in step with missions.lat and missions.lon."""
+    db.execute('ALTER TABLE missions ADD COLUMN lat REAL')
+    db.execute('ALTER TABLE missions ADD COLUMN lon REAL')
+    db.execute('ALTER TABLE missions ADD COLUMN remote BOOLEAN DEFAULT 0')
+    db.execute('ALTER TABLE users ADD COLUMN lat REAL')
+    db.execute('ALTER TABLE users ADD COLUMN lon REAL')
+    db.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS mission_geo USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
+        )
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS mission_geo_insert
+        AFTER INSERT ON missions WHEN NEW.lat IS NOT NULL
+        BEGIN
+            INSERT INTO mission_geo VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon);
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS mission_geo_delete
+        AFTER DELETE ON missions
+        BEGIN
+            DELETE FROM mission_geo WHERE id = OLD.id;
+        END
+    ''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS mission_geo_update
+        AFTER UPDATE OF lat, lon ON missions
+        BEGIN
+            DELETE FROM mission_geo WHERE id = OLD.id;
+            INSERT INTO mission_geo SELECT NEW.id, NEW.lat, NEW.lat, NEW.lon, NEW.lon
+            WHERE NEW.lat IS NOT NULL;
+        END
+    ''')
+    # refresh_derived_data() resolves the coordinates and remote flags, and
+    # rebuilds the features and terms that depend on them
+
+def migrate_job_queue(db):
+    """Durable queue drained by the JobQueue workers. Pending jobs are
+    unique per dedup_key; finished ones are kept for a while so clients
+    can read their result."""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            dedup_key TEXT,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            user_id INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at REAL NOT NULL,
+            locked_until REAL,
+            finished_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending_key
+        ON jobs (dedup_key) WHERE status IN ('queued', 'running')
+    ''')
+    # Claims walk it in lane order; lease and retention sweeps by status
+    db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, priority, run_at)')
+
+def migrate_job_sweep_indexes(db):
+    """Partial indexes for the JobQueue.maintain sweeps, which read the
+    whole jobs table: expired leases of running jobs, and finished jobs
+    past their retention."""
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_lease
+        ON jobs (locked_until) WHERE status = 'running'
+    ''')
+    db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_finished
+        ON jobs (finished_at) WHERE status IN ('done', 'failed')
+    ''')
+
+def migrate_stream_tickets(db):
+    """Single-use tickets /api/stream takes in its URL instead of the
+    bearer token. Only a digest of each ticket is stored."""
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS stream_tickets (
+            digest TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        ) WITHOUT ROWID
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_stream_tickets_expiry ON stream_tickets (expires_at)')
+
+def migrate_stats_candidates(db):
+    """Candidate counters were summed from matches, which nothing writes.
+    They now count the candidate ranking and are written by the
+    candidate_stats job: drop the matches triggers, reset the counters and
+    record when each association was last counted."""
+    for trigger in ('stats_match_insert', 'stats_match_update', 'stats_match_delete'):
+        db.execute('DROP TRIGGER IF EXISTS %s' % trigger)
+    db.execute('ALTER TABLE association_stats DROP COLUMN accepted_candidates')
+    db.execute('ALTER TABLE association_stats ADD COLUMN match_rate INTEGER NOT NULL DEFAULT 0')
+    db.execute('ALTER TABLE association_stats ADD COLUMN candidates_counted_at REAL')
+    db.execute('UPDATE association_stats SET total_candidates = 0, new_candidates = 0')
+
+# Applied in order; a database's PRAGMA user_version is the last one it has
+MIGRATIONS = [
+    (1, 'baseline schema', migrate_baseline),
+    (2, 'indexes for hot queries', migrate_hot_indexes),
+    (3, 'full-text search over missions', migrate_mission_search),
+    (4, 'gazetteer coordinates and R*Tree', migrate_geo),
+    (5, 'background job queue', migrate_job_queue),
+    (6, 'dashboard candidate counters from the ranking', migrate_stats_candidates),
+    (7, 'indexes for the job queue sweeps', migrate_job_sweep_indexes),
+    (8, 'single-use event stream tickets', migrate_stream_tickets),
+]
+
+def run_migrations(db):
+    """Apply pending migrations, each in its own transaction together with
+    the user_version bump, so a failed one leaves the database untouched.
+    Concurrent processes serialize on the write lock and skip what another
+    already applied."""
+    for version, description, migrate in MIGRATIONS:
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if db.execute('PRAGMA user_version').fetchone()[0] >= version:
+                db.rollback()
+                continue
+            migrate(db)
+            db.execute('PRAGMA user_version = %d' % version)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        app.logger.info('Applied migration %d: %s', version, description)
+
+# Version of the data app code derives from stored rows: mission features,
+# mission_terms, people_reached and coordinates. Bump it when that code
+# changes, and the next startup recomputes them for existing rows.
+DERIVED_DATA_VERSION = 1
+
+def refresh_derived_data(db):
+    """Recompute the derived data of existing rows with the current code,
+    once per DERIVED_DATA_VERSION. Migrations hold frozen SQL only, so rows
+    written by older releases catch up here."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        row = db.execute("SELECT version FROM data_versions WHERE name = 'derived'").fetchone()
+        if row is not None and row['version'] >= DERIVED_DATA_VERSION:
+            db.rollback()
+            return
+        db.execute('DELETE FROM mission_terms')
+        for mission in db.execute('SELECT * FROM missions').fetchall():
+            features = mission_features(mission)
+            geo = features['geo'] or (None, None)
+            db.execute('''
+                UPDATE missions SET features = ?, people_reached = ?, lat = ?, lon = ?, remote = ?
+                WHERE id = ?
+            ''', (json.dumps(features), estimate_people_reached(mission['impact_description']),
+                  geo[0], geo[1], int(features['remote']), mission['id']))
+            index_mission_terms(db, mission['id'], mission, features)
+        for user in db.execute('SELECT id, city FROM users').fetchall():
+            coords = resolve_location(user['city'])
+            if coords is not None:
+                db.execute('UPDATE users SET lat = ?, lon = ? WHERE id = ?', coords + (user['id'],))
+        reconcile_association_stats(db)
         db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                user_type TEXT NOT NULL,
-                name TEXT,
-                city TEXT,
-                age INTEGER,
-                job TEXT,
-                skills TEXT,
-                user_values TEXT,
-                availability TEXT,
-                profile_score INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            INSERT INTO data_versions (name, version, modified_at) VALUES ('derived', ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                version = excluded.version, modified_at = excluded.modified_at
+        ''', (DERIVED_DATA_VERSION, int(time.time())))
+        bump_data_version(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    app.logger.info('Refreshed derived data to version %d', DERIVED_DATA_VERSION)
+
+DEMO_MISSIONS = [
+    {
+        'title': 'Chargé·e de communication digitale',
+        'emoji': '🌊',
+        'impact': 'Gérer les réseaux sociaux de la campagne "Océans Propres" pour toucher +10K personnes.',
+        'location': 'À distance',
+        'commitment': '8h/mois',
+        'urgent': False,
+        'skills': [{'t': 'Social Media', 'c': 's'}, {'t': 'Rédaction', 'c': 's'}],
+        'tags': [{'t': 'Créativité', 'c': 'v'}, {'t': 'Autonomie', 'c': 'v'}]
+    },
+    {
+        'title': 'Designer de contenus',
+        'emoji': '🎨',
+        'impact': 'Créer des visuels pour sensibiliser 5000 personnes aux droits de l\'enfant.',
+        'location': 'À distance',
+        'commitment': '5h/mois',
+        'urgent': True,
+        'skills': [{'t': 'Design UX', 'c': 's'}, {'t': 'Photoshop', 'c': 's'}],
+        'tags': [{'t': 'Créativité', 'c': 'v'}, {'t': 'Empathie', 'c': 'v'}]
+    },
+    {
+        'title': 'Mentor informatique pour ados',
+        'emoji': '💻',
+        'impact': 'Accompagner 8 jeunes (12-17 ans) dans l\'apprentissage du code',
+        'location': 'Tunis El Menzah',
+        'commitment': '4h/mois',
+        'urgent': True,
+        'skills': [{'t': 'Dev Web', 'c': 's'}, {'t': 'Python', 'c': 's'}],
+        'tags': [{'t': 'Pédagogie', 'c': 'v'}, {'t': 'Patience', 'c': 'v'}]
+    }
+]
+
+def seed_demo_data(db):
+    """Insert the demo accounts and missions into an empty database."""
+    db.execute('BEGIN IMMEDIATE')
+    if db.execute('SELECT 1 FROM users LIMIT 1').fetchone() is not None:
+        db.rollback()
+        return
+    print("📦 Inserting sample data...")
+    
+    # Create demo association user
+    assoc_user_id = db.execute('''
+        INSERT INTO users (email, password, user_type, name, city, job, lat, lon)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        'greenpeace@demo.org', 
+        password_hasher.hash('demo123', in_process=True), 
+        'association', 
+        'Greenpeace Maroc',
+        'Casablanca',
+        'ONG Environnementale'
+    ) + (resolve_location('Casablanca') or (None, None))).lastrowid
+    
+    # Create association profile
+    assoc_id = db.execute('''
+        INSERT INTO associations (user_id, name, description, verified, impact_score)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        assoc_user_id, 
+        'Greenpeace Maroc', 
+        'Protection de l\'environnement et sensibilisation climatique', 
+        1, 
+        92
+    )).lastrowid
+    
+    # Create demo citizen user
+    db.execute('''
+        INSERT INTO users (email, password, user_type, name, city, age, job, skills, user_values, availability, profile_score, lat, lon)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        'amira@example.com',
+        password_hasher.hash('demo123', in_process=True),
+        'citizen',
+        'Amira Benali',
+        'Tunis',
+        24,
+        'Designer UX',
+        json.dumps(['Design UX/UI', 'Communication', 'Social Media']),
+        json.dumps(['🌱 Environnement', '📚 Éducation']),
+        json.dumps(['Lundi soir', 'Mercredi soir', 'Télétravail OK']),
+        85
+    ) + (resolve_location('Tunis') or (None, None)))
+    
+    # Create sample missions
+    insert_missions(db, assoc_id, [mission_from_payload(m) for m in DEMO_MISSIONS])
+    db.commit()
+    print("✅ Sample data inserted successfully!")
+
+def init_db():
+    db = get_db()
+    run_migrations(db)
+    refresh_derived_data(db)
+    seed_demo_data(db)
+    # Refresh planner statistics for tables that changed a lot
+    db.execute('PRAGMA optimize')
+
+# ============= TEXT RULES =============
+STOPWORDS = {
+    'de', 'du', 'des', 'la', 'le', 'les', 'et', 'en', 'un', 'une', 'pour',
+    'au', 'aux', 'a', 'l', 'd', 'ok', 'sur', 'avec', 'par'
+}
+
+def fold_text(text):
+    """Lowercase, strip accents and anything that is not a letter or digit."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+def term_tokens(term):
+    return {t for t in fold_text(term).split() if t not in STOPWORDS}
+
+def fold_accents(text):
+    """Lowercase and strip accents, keeping every other character."""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+def rules_normalizer():
+    """Normalization of the templates and value rules. RULES_LEGACY_MATCHING
+    (the default) keeps the plain lowercasing of the if/elif chains they
+    replaced; without it accents are folded, so 'Developpement' and
+    'Développement' match the same keywords."""
+    return str.lower if app.config['RULES_LEGACY_MATCHING'] else fold_accents
+
+def trie_pattern(words):
+    """Regex alternation of `words` factored along their prefix trie, so
+    matching at an offset costs the length of the longest word there, not
+    the number of words. It matches that longest word."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        return '(?:%s)?' % body if '' in node else body
+
+    return build(trie)
+
+class KeywordClassifier:
+    """Matches a declarative (category, keywords) table against text in one pass.
+
+    Rows are in priority order and keep the semantics of the if/elif chains
+    they replace: a category matches when one of its keywords occurs
+    anywhere in the normalized text, and best() returns the first matching
+    row. The keywords are compiled into one trie-shaped regex that finds
+    the longest keyword at every offset; the shorter keywords matching at
+    that offset are its prefixes, so their rows are precomputed per keyword.
+    """
+
+    def __init__(self, table, normalize=fold_text):
+        self._normalize = normalize
+        rows = [(category, [normalize(k) for k in keywords]) for category, keywords in table]
+        self._categories = [category for category, _ in rows]
+        self._rows = {}
+        for keyword in {k for _, keywords in rows for k in keywords}:
+            self._rows[keyword] = tuple(
+                position for position, (_, keywords) in enumerate(rows)
+                if any(keyword.startswith(k) for k in keywords)
             )
-        ''')
+        self._pattern = re.compile('(?=(%s))' % trie_pattern(self._rows))
+
+    def _hits(self, text):
+        hits = {}
+        for match in self._pattern.finditer(self._normalize(text)):
+            for position in self._rows[match.group(1)]:
+                hits[position] = hits.get(position, 0) + 1
+        return hits
+
+    def classify(self, text):
+        """Return [(category, weight)] for every matched category, in table
+        order; the weight counts the keyword occurrences of the category."""
+        hits = self._hits(text)
+        return [(self._categories[p], hits[p]) for p in sorted(hits)]
+
+    def best(self, text):
+        """Return the first matched category in table order, or None."""
+        hits = self._hits(text)
+        return self._categories[min(hits)] if hits else None
+
+# Cause domains of mission texts and citizen profiles, used for matching
+DOMAIN_KEYWORDS = {
+    'environnement': ['environ', 'ocean', 'climat', 'ecolo', 'plage', 'nature', 'dechet'],
+    'education': ['educ', 'ecole', 'enfant', 'jeune', 'ados', 'pedagog', 'formation', 'mentor', 'atelier'],
+    'sante': ['sante', 'medic', 'soin', 'hopital'],
+    'justice sociale': ['justice', 'droit', 'inclusion', 'egalite', 'refugie'],
+    'culture': ['culture', 'art', 'musique', 'patrimoine', 'theatre'],
+    'numerique': ['numeri', 'digital', 'informatique', 'code', 'dev web', 'programmation']
+}
+
+DOMAIN_LABELS = {
+    'environnement': '🌱 Environnement',
+    'education': '📚 Éducation',
+    'sante': '⚕️ Santé',
+    'justice sociale': '⚖️ Justice sociale',
+    'culture': '🎨 Culture',
+    'numerique': '💻 Numérique'
+}
+
+DOMAIN_CLASSIFIER = KeywordClassifier(DOMAIN_KEYWORDS.items())
+
+# Recommended domain for a value chip of the profile form, first match wins
+VALUE_DOMAIN_KEYWORDS = [
+    ('environnement', ['environ']),
+    ('education', ['éduc', 'educ']),
+    ('sante', ['santé']),
+    ('justice sociale', ['justice']),
+    ('culture', ['culture']),
+    ('numerique', ['numéri'])
+]
+VALUE_DOMAIN_CLASSIFIER = KeywordClassifier(VALUE_DOMAIN_KEYWORDS, normalize=rules_normalizer())
+
+# Mission templates in priority order: (name, keywords, template)
+MISSION_TEMPLATES = [
+    (
+        'design',
+        ['design', 'graphiste', 'visuel', 'créatif'],
+        {
+            "title": "Designer créatif pour campagne impactante",
+            "emoji": "🎨",
+            "impact": "Créer des visuels qui sensibiliseront 5000 personnes à notre cause",
+            "tags": [
+                {"t": "Design", "c": "mts"},
+                {"t": "Créativité", "c": "mtso"},
+                {"t": "5h/semaine", "c": "mtl"}
+            ],
+            "commitment": "Moyen - 5h/semaine en télétravail",
+            "profiles": "32 profils",
+            "attract": "87%",
+            "matches": "8 matchs"
+        }
+    ),
+    (
+        'communication',
+        ['communica', 'réseaux', 'social', 'media', 'content'],
+        {
+            "title": "Community manager pour ONG",
+            "emoji": "📱",
+            "impact": "Animer les réseaux sociaux pour toucher 10K personnes",
+            "tags": [
+                {"t": "Social Media", "c": "mts"},
+                {"t": "Rédaction", "c": "mtso"},
+                {"t": "3h/semaine", "c": "mtl"}
+            ],
+            "commitment": "Léger - 3h/semaine",
+            "profiles": "45 profils",
+            "attract": "92%",
+            "matches": "12 matchs"
+        }
+    ),
+    (
+        'tech',
+        ['code', 'dev', 'programmation', 'informatique'],
+        {
+            "title": "Mentor en programmation pour jeunes",
+            "emoji": "💻",
+            "impact": "Former 20 jeunes aux bases du développement web",
+            "tags": [
+                {"t": "Dev Web", "c": "mts"},
+                {"t": "Pédagogie", "c": "mtso"},
+                {"t": "4h/semaine", "c": "mtl"}
+            ],
+            "commitment": "Moyen - 4h/semaine",
+            "profiles": "28 profils",
+            "attract": "84%",
+            "matches": "6 matchs"
+        }
+    ),
+    (
+        'education',
+        ['atelier', 'formation', 'enseigner', 'éduc'],
+        {
+            "title": "Formateur·rice pour ateliers éducatifs",
+            "emoji": "📚",
+            "impact": "Animer des ateliers pour 30 enfants de quartiers défavorisés",
+            "tags": [
+                {"t": "Formation", "c": "mts"},
+                {"t": "Pédagogie", "c": "mtso"},
+                {"t": "Week-end", "c": "mtl"}
+            ],
+            "commitment": "Occasionnel - 2 samedis/mois",
+            "profiles": "38 profils",
+            "attract": "89%",
+            "matches": "10 matchs"
+        }
+    )
+]
+
+DEFAULT_MISSION_TEMPLATE = {
+    "title": "Mission de bénévolat",
+    "emoji": "🤝",
+    "impact": "Contribuer à une cause importante selon vos compétences",
+    "tags": [
+        {"t": "Polyvalence", "c": "mtso"},
+        {"t": "Flexible", "c": "mtl"}
+    ],
+    "commitment": "Flexible - selon disponibilités",
+    "profiles": "28 profils",
+    "attract": "75%",
+    "matches": "5 matchs"
+}
+
+MISSION_CLASSIFIER = KeywordClassifier(
+    ((name, keywords) for name, keywords, _ in MISSION_TEMPLATES), normalize=rules_normalizer()
+)
+MISSION_TEMPLATE_BY_NAME = {name: template for name, _, template in MISSION_TEMPLATES}
+
+# ============= AI SERVICE =============
+class RuleProvider:
+    """Offline keyword rules: the default provider and every other one's fallback."""
+
+    name = 'rules'
+
+    async def complete(self, task, payload):
+        return getattr(self, task)(payload)
+
+    async def complete_batch(self, task, payloads):
+        return [getattr(self, task)(payload) for payload in payloads]
+
+    @staticmethod
+    def analyze_profile(profile_data):
+        """Analyze citizen profile and return insights"""
+        skills_count = len(profile_data.get('skills', []))
+        values_count = len(profile_data.get('values', []))
+        availability_count = len(profile_data.get('availability', []))
         
-        # Create associations table
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS associations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER UNIQUE,
-                name TEXT,
-                description TEXT,
-                logo TEXT,
-                verified BOOLEAN DEFAULT 0,
-                impact_score REAL DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
+        # Calculate score
+        score = min(100, 60 + skills_count * 5 + values_count * 3 + availability_count * 2)
         
-        # Create missions table
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS missions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                association_id INTEGER,
-                title TEXT,
-                emoji TEXT,
-                description TEXT,
-                impact_description TEXT,
-                location TEXT,
-                commitment TEXT,
-                skills_required TEXT,
-                tags TEXT,
-                urgent BOOLEAN DEFAULT 0,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (association_id) REFERENCES associations (id)
-            )
-        ''')
+        # Generate recommendations
+        domains = []
+        for v in profile_data.get('values', []):
+            domain = VALUE_DOMAIN_CLASSIFIER.best(v)
+            if domain:
+                domains.append(DOMAIN_LABELS[domain])
         
-        # Insert sample data if database is empty
-        user_count = db.execute('SELECT COUNT(*) as count FROM users').fetchone()['count']
-        if user_count == 0:
-            print("📦 Inserting sample data...")
-            
-            # Create demo association user
-            db.execute('''
-                INSERT INTO users (email, password, user_type, name, city, job)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                'greenpeace@demo.org', 
-                hashlib.sha256('demo123'.encode()).hexdigest(), 
-                'association', 
-                'Greenpeace Maroc',
-                'Casablanca',
-                'ONG Environnementale'
-            ))
-            
-            assoc_user_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
-            
-            # Create association profile
+        # Remove duplicates and limit to 3
+        domains = list(dict.fromkeys(domains))[:3]
+        if not domains:
+            domains = ["🌱 Environnement", "📚 Éducation", "💻 Numérique"][:min(3, skills_count)]
+        
+        # Soft skills based on job/age
+        soft_skills = []
+        if skills_count > 2:
+            soft_skills.extend(["Communication", "Créativité"])
+        if values_count > 1:
+            soft_skills.append("Empathie")
+        if availability_count > 2:
+            soft_skills.append("Organisation")
+        
+        return {
+            "score": score,
+            "recommendations": domains,
+            "soft_skills": soft_skills[:3],
+            "advice": "Complète ton profil avec tes disponibilités pour des matchs encore plus précis !",
+            "domains": domains
+        }
+    
+    @staticmethod
+    def generate_mission_from_text(text):
+        """Generate mission from natural language"""
+        name = MISSION_CLASSIFIER.best(text)
+        template = MISSION_TEMPLATE_BY_NAME[name] if name else DEFAULT_MISSION_TEMPLATE
+        return copy.deepcopy(template)
+
+AI_TASKS = ('analyze_profile', 'generate_mission_from_text')
+
+AI_PROMPTS = {
+    'analyze_profile': (
+        "Tu es l'assistant d'ImpactMatch, une plateforme de bénévolat au Maghreb. "
+        "Analyse le profil JSON d'un·e citoyen·ne et réponds uniquement avec un objet JSON "
+        "contenant les clés score (entier 0-100), recommendations (liste de domaines avec emoji), "
+        "soft_skills (liste, 3 max), advice (une phrase) et domains (liste)."
+    ),
+    'generate_mission_from_text': (
+        "Tu es l'assistant d'ImpactMatch. À partir de la description libre d'un besoin "
+        "d'association, rédige une mission de bénévolat. Réponds uniquement avec un objet JSON "
+        "contenant les clés title, emoji, impact, tags (liste d'objets {t, c} avec c parmi "
+        "mts, mtso, mtl), commitment, profiles, attract et matches."
+    )
+}
+
+# Appended to a task's prompt when several inputs share one request
+AI_BATCH_PROMPT = (
+    " Tu reçois ici une liste JSON de plusieurs entrées : réponds uniquement avec un objet "
+    "JSON {\"results\": [...]} qui contient, dans le même ordre, un tel objet par entrée."
+)
+
+class OpenAIProvider:
+    """Chat-completion backend for any OpenAI-compatible HTTP server."""
+
+    name = 'openai'
+
+    def __init__(self, api_key, api_base, model, timeout):
+        import openai  # only needed when this backend is configured
+        self._openai = openai
+        self.api_key = api_key
+        self.api_base = api_base
+        self.model = model
+        self.timeout = timeout
+    async def _chat(self, prompt, payload):
+        response = await self._openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': prompt},
+                {'role': 'user', 'content': json.dumps(payload, ensure_ascii=False)}
+            ],
+            temperature=0.2,
+            api_key=self.api_key,
+            api_base=self.api_base,
+            request_timeout=self.timeout
+        )
+        return json.loads(response['choices'][0]['message']['content'])
+
+    @staticmethod
+    def _checked(task, payload, result):
+        if not isinstance(result, dict):
+            raise ValueError('LLM answer is not an object')
+        reference = getattr(RuleProvider, task)(payload)
+        missing = set(reference) - set(result)
+        if missing:
+            raise ValueError('LLM answer is missing %s' % ', '.join(sorted(missing)))
+        return result
+
+    async def complete(self, task, payload):
+        return self._checked(task, payload, await self._chat(AI_PROMPTS[task], payload))
+
+    async def complete_batch(self, task, payloads):
+        """Answer several payloads of one task with a single request. Returns
+        one answer per payload, or the exception that rejected it."""
+        if len(payloads) == 1:
+            return [await self.complete(task, payloads[0])]
+        answer = await self._chat(AI_PROMPTS[task] + AI_BATCH_PROMPT, payloads)
+        results = answer.get('results') if isinstance(answer, dict) else None
+        if not isinstance(results, list) or len(results) != len(payloads):
+            raise ValueError('LLM batch answer does not hold %d results' % len(payloads))
+        answers = []
+        for payload, result in zip(payloads, results):
+            try:
+                answers.append(self._checked(task, payload, result))
+            except ValueError as e:
+                answers.append(e)
+        return answers
+
+class AIGateway:
+    """Runs AI tasks on a provider without ever holding up a request.
+
+    Calls are submitted to an asyncio loop running in a background thread.
+    Calls for the same task that arrive within `batch_window` seconds, up to
+    `batch_size` of them, go to the provider as one request, and at most
+    `concurrency` requests run at a time. Results are cached by a hash of
+    task and payload, and identical in-flight calls share one batch slot.
+
+    Job workers wait at most `timeout` seconds and then get the rule
+    engine's answer instead. A request thread never waits: it gets the
+    cached answer or the rules' one, and the call goes on to fill the cache.
+    """
+
+    def __init__(self, provider, timeout=8.0, concurrency=4, batch_size=8,
+                 batch_window=0.05, cache_size=1024):
+        self.provider = provider
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_pid = None
+        self._inflight = {}
+        self._pending = {}
+        self._stats = {'calls': 0, 'cache_hits': 0, 'shared': 0, 'batches': 0,
+                       'fallbacks': 0, 'deferred': 0}
+
+    @staticmethod
+    def cache_key(task, payload):
+        raw = json.dumps([task, payload], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def run(self, task, payload):
+        if isinstance(self.provider, RuleProvider):
+            return getattr(RuleProvider, task)(payload)
+
+        key = self.cache_key(task, payload)
+        with self._lock:
+            self._stats['calls'] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._stats['cache_hits'] += 1
+                return self._cache[key]
+
+        future = asyncio.run_coroutine_threadsafe(self._submit(key, task, payload), self._ensure_loop())
+        if has_request_context():
+            with self._lock:
+                self._stats['deferred'] += 1
+            return getattr(RuleProvider, task)(payload)
+        try:
+            return future.result(timeout=self.timeout)
+        except Exception as e:
+            future.cancel()
+            with self._lock:
+                self._stats['fallbacks'] += 1
+            app.logger.warning('AI provider %s failed on %s, using rules: %r',
+                               self.provider.name, task, e)
+            return getattr(RuleProvider, task)(payload)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop_pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._loop_pid = os.getpid()
+                self._inflight = {}
+                self._pending = {}
+                threading.Thread(target=self._run_loop, args=(self._loop,),
+                                 name='ai-gateway', daemon=True).start()
+            return self._loop
+
+    def _run_loop(self, loop):
+        asyncio.set_event_loop(loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        loop.run_forever()
+
+    async def _submit(self, key, task, payload):
+        shared = self._inflight.get(key)
+        if shared is not None:
+            with self._lock:
+                self._stats['shared'] += 1
+            return await asyncio.shield(shared)
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        self._inflight[key] = result
+        batch = self._pending.setdefault(task, [])
+        batch.append((key, payload, result))
+        if len(batch) >= self.batch_size:
+            self._flush(task, batch)
+        elif len(batch) == 1:
+            loop.call_later(self.batch_window, self._flush, task, batch)
+        # The batch outlives a caller that times out, so it still fills the cache
+        return await asyncio.shield(result)
+
+    def _flush(self, task, batch):
+        # The window's timer finds nothing to do when the batch filled up first
+        if self._pending.get(task) is not batch:
+            return
+        del self._pending[task]
+        self._loop.create_task(self._call(task, batch))
+
+    async def _call(self, task, batch):
+        try:
+            async with self._semaphore:
+                with self._lock:
+                    self._stats['batches'] += 1
+                values = await asyncio.wait_for(
+                    self.provider.complete_batch(task, [payload for _, payload, _ in batch]),
+                    self.timeout
+                )
+        except Exception as e:
+            values = [e] * len(batch)
+        for (key, _, result), value in zip(batch, values):
+            self._inflight.pop(key, None)
+            if isinstance(value, Exception):
+                result.set_exception(value)
+                # Nobody may be waiting any more once the caller timed out
+                result.exception()
+                continue
+            with self._lock:
+                self._cache[key] = value
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            result.set_result(value)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, provider=self.provider.name, cache_entries=len(self._cache))
+
+def make_ai_provider(config):
+    if config['AI_PROVIDER'] == 'openai':
+        return OpenAIProvider(
+            config['OPENAI_API_KEY'],
+            config['OPENAI_API_BASE'],
+            config['AI_MODEL'],
+            config['AI_TIMEOUT']
+        )
+    return RuleProvider()
+
+ai_gateway = AIGateway(
+    make_ai_provider(app.config),
+    timeout=app.config['AI_TIMEOUT'],
+    concurrency=app.config['AI_CONCURRENCY'],
+    batch_size=app.config['AI_BATCH_SIZE'],
+    batch_window=app.config['AI_BATCH_WINDOW'],
+    cache_size=app.config['AI_CACHE_SIZE']
+)
+
+class AIService:
+    @staticmethod
+    def analyze_profile(profile_data):
+        """Analyze citizen profile and return insights"""
+        return ai_gateway.run('analyze_profile', profile_data)
+    
+    @staticmethod
+    def generate_mission_from_text(text):
+        """Generate mission from natural language"""
+        return ai_gateway.run('generate_mission_from_text', text)
+
+# ============= GEO =============
+KM_PER_DEGREE = 111.32
+EARTH_RADIUS_KM = 6371.0
+# Side of the grid cells used as matching features, about 28 km of latitude
+GEO_CELL_DEGREES = 0.25
+# Distance under which a match gives proximity as a reason
+NEAR_REASON_KM = 60
+
+@functools.lru_cache(maxsize=1)
+def load_gazetteer():
+    """{folded place name: (lat, lon)} from the bundled CSV of Tunisian and
+    Moroccan cities and neighbourhoods, aliases included."""
+    places = {}
+    path = app.config['GAZETTEER_PATH']
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                coords = (float(row['lat']), float(row['lon']))
+                for name in [row['name']] + (row['aliases'] or '').split('|'):
+                    if fold_text(name):
+                        places.setdefault(fold_text(name), coords)
+    except OSError:
+        app.logger.warning('Gazetteer %s not found, locations stay unresolved', path)
+    return places
+
+def resolve_location(text):
+    """Coordinates of the place named in a free-text location, or None.
+
+    The longest known name wins, so 'Tunis El Menzah' resolves to El Menzah
+    rather than to the centre of Tunis.
+    """
+    words = fold_text(text).split()
+    places = load_gazetteer()
+    for size in range(min(len(words), 4), 0, -1):
+        for start in range(len(words) - size + 1):
+            coords = places.get(' '.join(words[start:start + size]))
+            if coords is not None:
+                return coords
+    return None
+
+def user_coords(user):
+    """Coordinates of a users row (stored on write) or of a plain mapping."""
+    if 'lat' in user.keys() and user['lat'] is not None:
+        return (user['lat'], user['lon'])
+    return resolve_location(user['city'])
+
+def haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+def sql_haversine_km(lat1, lon1, lat2, lon2):
+    return haversine_km((lat1, lon1), (lat2, lon2))
+
+def geo_cell(coords):
+    return (math.floor(coords[0] / GEO_CELL_DEGREES), math.floor(coords[1] / GEO_CELL_DEGREES))
+
+def bounding_box(coords, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) of a box containing the circle."""
+    lat, lon = coords
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    return (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+
+def missions_near_query(coords, radius_km):
+    """(sql, params) selecting the ids of on-site missions within radius_km
+    of coords.
+
+    The mission_geo R*Tree narrows the search to the bounding box of the
+    circle; only missions inside the box get an exact distance check.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(coords, radius_km)
+    # Missions are points: each entry's min corner is its location
+    sql = '''
+        SELECT id FROM mission_geo
+        WHERE min_lat <= ? AND max_lat >= ? AND min_lon <= ? AND max_lon >= ?
+          AND haversine_km(?, ?, min_lat, min_lon) <= ?
+    '''
+    return sql, [max_lat, min_lat, max_lon, min_lon, coords[0], coords[1], radius_km]
+
+def missions_near(db, coords, radius_km):
+    """Ids of on-site missions within radius_km of coords."""
+    sql, params = missions_near_query(coords, radius_km)
+    return {r[0] for r in db.execute(sql, params)}
+
+def restriction_queries(filters, near):
+    """(sql, params) subqueries of the mission ids allowed by term filters
+    and a parse_near() radius; all of them must match."""
+    queries = [mission_terms_query(filters)] if filters else []
+    if near is not None:
+        queries.append(missions_near_query(*near))
+    return queries
+
+def restrict_missions(db, filters, near):
+    """Ids allowed by term filters and a parse_near() radius, or None when
+    neither is given."""
+    only = filter_missions(db, filters) if filters else None
+    if near is not None:
+        nearby = missions_near(db, *near)
+        only = nearby if only is None else only & nearby
+    return only
+
+def parse_near(args):
+    """Turn ?near=<place>&radius_km= into (coords, radius), or None.
+    Raises ValueError for unknown places and bad radii."""
+    near = args.get('near')
+    if not near:
+        return None
+    coords = resolve_location(near)
+    if coords is None:
+        raise ValueError('Unknown location: %s' % near)
+    radius = args.get('radius_km', 25, type=float)
+    if not 0 < radius <= app.config['NEAR_MAX_RADIUS_KM']:
+        raise ValueError('radius_km must be between 0 and %d' % app.config['NEAR_MAX_RADIUS_KM'])
+    return coords, radius
+
+# ============= MATCHING ENGINE =============
+REMOTE_MARKERS = ('distance', 'teletravail', 'remote', 'en ligne')
+
+def detect_domains(text):
+    return [domain for domain, _ in DOMAIN_CLASSIFIER.classify(text)]
+
+def load_json_list(raw):
+    if not raw:
+        return []
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return []
+    return value if isinstance(value, list) else []
+
+def monthly_hours(commitment):
+    """Rough monthly load from strings like '8h/mois' or '5h/semaine'."""
+    folded = fold_text(commitment)
+    match = re.search(r'(\d+)\s*h', folded)
+    if not match:
+        return None
+    hours = int(match.group(1))
+    if 'semaine' in folded or 'sem' in folded.split():
+        hours *= 4
+    return hours
+
+def load_bucket(hours):
+    if hours is None:
+        return None
+    if hours <= 5:
+        return 'light'
+    if hours <= 16:
+        return 'medium'
+    return 'heavy'
+
+PEOPLE_WORDS = (
+    'personnes', 'jeunes', 'enfants', 'ados', 'familles', 'eleves', 'etudiants',
+    'femmes', 'habitants', 'beneficiaires', 'patients'
+)
+
+def estimate_people_reached(text):
+    """Number of people a mission claims to reach, e.g. '+10K personnes'."""
+    # Drop thousands separators first so '10 000' and '10.000' read as one number
+    text = re.sub(r'(?<=\d)[\s.,\u202f](?=\d{3}\b)', '', text or '')
+    match = re.search(
+        r'(\d+)\s*(k)?\s+(?:[a-z]+\s+)?(?:%s)\b' % '|'.join(PEOPLE_WORDS),
+        fold_text(text)
+    )
+    if not match:
+        return 0
+    return int(match.group(1)) * (1000 if match.group(2) else 1)
+
+def mission_features(mission):
+    """Build the compact feature vector stored alongside a mission.
+
+    `mission` is a mapping with the missions table columns. Tags with a
+    skill class ('s', 'mts') feed the skill terms, value tags ('v', 'mtso')
+    feed the value terms, and cause domains are detected in the free text.
+    """
+    skills = []
+    values = []
+    for tag in load_json_list(mission['skills_required']) + load_json_list(mission['tags']):
+        if not isinstance(tag, dict) or not tag.get('t'):
+            continue
+        cls = tag.get('c', 's')
+        if cls in ('s', 'mts'):
+            skills.append(tag['t'])
+        elif cls in ('v', 'mtso'):
+            values.append(tag['t'])
+
+    text = ' '.join(filter(None, [
+        mission['title'], mission['description'], mission['impact_description']
+    ]))
+    location = fold_text(mission['location'])
+    commitment = fold_text(mission['commitment'])
+    remote = not location or any(m in location or m in commitment for m in REMOTE_MARKERS)
+    coords = None if remote else resolve_location(location)
+
+    return {
+        'skills': list(dict.fromkeys(skills)),
+        'values': list(dict.fromkeys(fold_text(v) for v in values if fold_text(v))),
+        'domains': detect_domains(text),
+        'remote': remote,
+        'city': location.split()[0] if location and not remote else None,
+        'geo': list(coords) if coords else None,
+        'load': load_bucket(monthly_hours(mission['commitment']))
+    }
+
+def citizen_features(user):
+    """Build the query vector for a citizen row of the users table."""
+    skills = load_json_list(user['skills'])
+    values = load_json_list(user['user_values'])
+    availability = load_json_list(user['availability'])
+
+    domains = []
+    for v in values:
+        domains.extend(detect_domains(v))
+    slots = [a for a in availability if not any(m in fold_text(a) for m in REMOTE_MARKERS)]
+    if not slots:
+        loads = {'light', 'medium', 'heavy'}
+    elif len(slots) == 1:
+        loads = {'light'}
+    elif len(slots) <= 3:
+        loads = {'light', 'medium'}
+    else:
+        loads = {'light', 'medium', 'heavy'}
+
+    city = fold_text(user['city'])
+    return {
+        'skill_tokens': set().union(*[term_tokens(s) for s in skills]) if skills else set(),
+        'values': {fold_text(v) for v in values if fold_text(v)},
+        'domains': set(domains),
+        'remote_ok': not availability or any(
+            m in fold_text(a) for a in availability for m in REMOTE_MARKERS
+        ),
+        'city': city.split()[0] if city else None,
+        'geo': user_coords(user),
+        'loads': loads
+    }
+
+# Term kinds in the mission_terms index and the query parameter that filters on each
+TERM_FILTERS = {'skill': 's', 'value': 'v', 'city': 'c'}
+
+def mission_terms(mission, features):
+    """Return the (kind, term) postings of a mission for the mission_terms index."""
+    terms = set()
+    for skill in features.get('skills', []):
+        terms.update(('s', t) for t in term_tokens(skill))
+    for value in features.get('values', []) + features.get('domains', []):
+        terms.update(('v', t) for t in term_tokens(value))
+    terms.update(('c', t) for t in term_tokens(mission['location']))
+    if mission['urgent']:
+        terms.add(('f', 'urgent'))
+    if features.get('remote'):
+        terms.add(('f', 'remote'))
+    return terms
+
+def index_mission_terms(db, mission_id, mission, features):
+    db.executemany(
+        'INSERT OR IGNORE INTO mission_terms (kind, term, mission_id) VALUES (?, ?, ?)',
+        [(kind, term, mission_id) for kind, term in mission_terms(mission, features)]
+    )
+
+def mission_terms_query(filters):
+    """(sql, params) selecting the ids of missions matching term filters.
+
+    `filters` is a list of (kind, prefix) pairs that must all match. Each
+    pair is a range scan over the (kind, term) primary key, and the posting
+    lists are intersected by SQLite without touching the missions table.
+    """
+    clauses = []
+    params = []
+    for kind, prefix in filters:
+        # Terms are folded to [a-z0-9], all of which sort before '{'
+        clauses.append('SELECT mission_id FROM mission_terms WHERE kind = ? AND term >= ? AND term < ?')
+        params.extend([kind, prefix, prefix + '{'])
+    return ' INTERSECT '.join(clauses), params
+
+def filter_missions(db, filters):
+    """Resolve term filters to the set of matching mission ids."""
+    sql, params = mission_terms_query(filters)
+    return {r[0] for r in db.execute(sql, params)}
+
+def parse_mission_filters(args):
+    """Turn ?skill=, ?value=, ?city=, ?urgent= and ?remote= into index filters.
+
+    Parameters may repeat and hold several words; every word is matched as
+    an accent-insensitive prefix and all of them must match.
+    """
+    filters = []
+    for param, kind in TERM_FILTERS.items():
+        for raw in args.getlist(param):
+            filters.extend((kind, t) for t in term_tokens(raw))
+    for flag in ('urgent', 'remote'):
+        if args.get(flag, '').lower() in ('1', 'true', 'yes'):
+            filters.append(('f', flag))
+    return filters
+
+class MatchEngine:
+    """Vectorized scorer over precomputed mission feature vectors.
+
+    Missions are rows of a sparse weight matrix stored column-wise: each
+    feature ('s:<token>', 'v:<value>', 'd:<domain>', 'remote', 'geo:<cell>',
+    'city:<name>', 'load:<bucket>') owns a posting array of rows and per-row weights. A
+    citizen score is then the sparse dot product of their features with the
+    matrix, computed with one NumPy scatter-add per citizen feature.
+    """
+
+    BASE = 40
+    SKILL_WEIGHT = 35
+    VALUE_WEIGHT = 15
+    FIT_WEIGHT = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._rows = {}
+        self._features = []
+        self._postings = {}
+        self._arrays = {}
+        self._max_id = 0
+
+    def add(self, mission_id, features):
+        with self._lock:
+            self._add(mission_id, features)
+
+    @classmethod
+    def weights(cls, features):
+        """Return the mission's {feature: weight} row and its skill terms."""
+        skill_terms = [(s, term_tokens(s)) for s in features.get('skills', [])]
+        skill_tokens = set().union(*[t for _, t in skill_terms]) if skill_terms else set()
+        value_keys = ['v:' + v for v in features.get('values', [])]
+        value_keys += ['d:' + d for d in features.get('domains', [])]
+
+        weights = {}
+        for token in skill_tokens:
+            weights['s:' + token] = cls.SKILL_WEIGHT / len(skill_tokens)
+        for key in value_keys:
+            weights[key] = cls.VALUE_WEIGHT / len(value_keys)
+        if features.get('remote'):
+            weights['remote'] = cls.FIT_WEIGHT / 2
+        elif features.get('geo'):
+            # Full weight in the mission's grid cell, half in the ring around
+            # it, so citizens of neighbouring towns still get a share
+            lat, lon = geo_cell(features['geo'])
+            for dlat in (-1, 0, 1):
+                for dlon in (-1, 0, 1):
+                    share = 2 if dlat == dlon == 0 else 4
+                    weights['geo:%d:%d' % (lat + dlat, lon + dlon)] = cls.FIT_WEIGHT / share
+        elif features.get('city'):
+            weights['city:' + features['city']] = cls.FIT_WEIGHT / 2
+        if features.get('load'):
+            weights['load:' + features['load']] = cls.FIT_WEIGHT / 2
+        return weights, skill_terms
+
+    def _add(self, mission_id, features):
+        if mission_id <= self._max_id:
+            return
+        row = len(self._ids)
+        weights, skill_terms = self.weights(features)
+
+        for key, weight in weights.items():
+            posting = self._postings.setdefault(key, ([], []))
+            posting[0].append(row)
+            posting[1].append(weight)
+            self._arrays.pop(key, None)
+        self._ids.append(mission_id)
+        self._rows[mission_id] = row
+        self._features.append((features, skill_terms))
+        self._max_id = mission_id
+
+    def _array(self, key):
+        cached = self._arrays.get(key)
+        if cached is None:
+            rows, weights = self._postings[key]
+            cached = (np.array(rows, dtype=np.int32), np.array(weights, dtype=np.float32))
+            self._arrays[key] = cached
+        return cached
+
+    def refresh(self, db):
+        """Pull missions written since the last refresh (possibly by another
+        worker process). Feature vectors are read as stored, never rebuilt."""
+        # The unary + keeps the planner on the rowid range: the status index
+        # would walk every active mission on each request
+        rows = db.execute('''
+            SELECT id, features FROM missions
+            WHERE id > ? AND +status = 'active'
+            ORDER BY id
+        ''', (self._max_id,)).fetchall()
+        if rows:
+            with self._lock:
+                for row in rows:
+                    self._add(row['id'], json.loads(row['features'] or '{}'))
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def query_keys(citizen):
+        keys = ['s:' + t for t in citizen['skill_tokens']]
+        keys += ['v:' + v for v in citizen['values']]
+        keys += ['d:' + d for d in citizen['domains']]
+        if citizen['remote_ok']:
+            keys.append('remote')
+        if citizen['city']:
+            keys.append('city:' + citizen['city'])
+        if citizen.get('geo'):
+            keys.append('geo:%d:%d' % geo_cell(citizen['geo']))
+        keys += ['load:' + b for b in citizen['loads']]
+        return keys
+
+    def _score_all(self, citizen, only=None):
+        with self._lock:
+            n = len(self._ids)
+            ids = self._ids
+            features = self._features
+            columns = [self._array(key) for key in self.query_keys(citizen)
+                       if key in self._postings]
+            subset = None
+            if only is not None:
+                subset = np.fromiter(
+                    (self._rows[mid] for mid in only if mid in self._rows), dtype=np.int64
+                )
+
+        scores = np.full(n, self.BASE, dtype=np.float32)
+        for rows, weights in columns:
+            scores[rows] += weights
+        return ids, features, scores, subset
+
+    def rank(self, citizen, k=50, only=None):
+        """Return [(mission_id, score, reasons)] for the top-k missions,
+        optionally restricted to the mission ids in `only`."""
+        ids, features, scores, subset = self._score_all(citizen, only)
+        n = len(scores)
+        if n == 0:
+            return []
+
+        # Break ties on recency: rows are appended in mission id order
+        order = np.rint(scores).astype(np.int64) * n + np.arange(n, dtype=np.int64)
+        if subset is not None:
+            order = order[subset]
+        m = len(order)
+        k = min(k, m)
+        if k == 0:
+            return []
+        top = order[np.argpartition(order, m - k)[m - k:]]
+        top = np.sort(top)[::-1]
+
+        result = []
+        for key in top.tolist():
+            mission_features, skill_terms = features[key % n]
+            result.append((ids[key % n], key // n,
+                           self.reasons(mission_features, citizen, skill_terms)))
+        return result
+
+    def score(self, citizen, mission_ids):
+        """Return {mission_id: (score, reasons)} for the given missions."""
+        ids, features, scores, subset = self._score_all(citizen, mission_ids)
+        return {
+            ids[row]: (int(round(float(scores[row]))),
+                       self.reasons(features[row][0], citizen, features[row][1]))
+            for row in subset.tolist()
+        }
+
+    @staticmethod
+    def reasons(features, citizen, skill_terms=None):
+        """Human-readable reasons a citizen and a mission match."""
+        if skill_terms is None:
+            skill_terms = [(s, term_tokens(s)) for s in features.get('skills', [])]
+        reasons = []
+        shared = [term for term, tokens in skill_terms if tokens & citizen['skill_tokens']]
+        if shared:
+            reasons.append('Compétences alignées : ' + ', '.join(shared))
+        domains = [DOMAIN_LABELS[d] for d in features.get('domains', []) if d in citizen['domains']]
+        values = [v for v in features.get('values', []) if v in citizen['values']]
+        if domains or values:
+            reasons.append('Valeurs partagées : ' + ', '.join(domains + values))
+        if features.get('remote') and citizen['remote_ok']:
+            reasons.append('Mission à distance')
+        elif features.get('city') and features['city'] == citizen['city']:
+            reasons.append('Dans ta ville')
+        elif features.get('geo') and citizen.get('geo'):
+            distance = haversine_km(features['geo'], citizen['geo'])
+            if distance <= NEAR_REASON_KM:
+                reasons.append('À %d km de chez toi' % max(1, round(distance)))
+        if features.get('load') in citizen['loads']:
+            reasons.append('Engagement compatible avec tes disponibilités')
+        return reasons
+
+class CandidateEngine:
+    """Reverse matching: the best citizens for each mission.
+
+    Citizens are indexed like missions in MatchEngine (one posting array
+    per feature), so scoring a mission against every citizen is a handful
+    of NumPy scatter-adds. Each mission's top-K is computed once, on first
+    request, and then kept as a min-heap. Citizen profile updates go to a
+    changelog that a heap replays, in place, the next time its mission is
+    read, instead of rescoring the whole user table or touching every heap
+    on each update.
+
+    An updated profile leaves its previous row behind as a tombstone; once
+    tombstones pass TOMBSTONE_RATIO of the rows the arrays are compacted.
+    """
+
+    K = 50
+    # Compact once this share of the rows are tombstones, and at least TOMBSTONE_MIN
+    TOMBSTONE_RATIO = 0.25
+    TOMBSTONE_MIN = 256
+    # Heaps more than this many updates behind are dropped and rebuilt on read
+    LOG_LIMIT = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._rows = {}
+        self._alive = []
+        self._citizens = []
+        self._postings = {}
+        self._arrays = {}
+        self._rev = -1
+        self._heaps = {}
+        self._members = {}
+        self._log = []
+        self._log_start = 0
+        self._stats = {'compactions': 0, 'dropped_heaps': 0}
+
+    def refresh(self, db):
+        """Apply citizen profiles written since the last refresh."""
+        # Under the lock, so two requests never both apply the same rows
+        with self._lock:
+            rows = db.execute('''
+                SELECT id, skills, user_values, availability, city, lat, lon, profile_rev FROM users
+                WHERE user_type = 'citizen' AND profile_rev > ?
+                ORDER BY profile_rev
+            ''', (self._rev,)).fetchall()
+            for row in rows:
+                self._update(row['id'], citizen_features(row))
+                self._rev = max(self._rev, row['profile_rev'])
+
+    def citizen(self, user_id):
+        with self._lock:
+            row = self._rows.get(user_id)
+            return self._citizens[row] if row is not None else None
+
+    def update_citizen(self, user_id, citizen):
+        with self._lock:
+            self._update(user_id, citizen)
+
+    def _update(self, user_id, citizen):
+        keys = set(MatchEngine.query_keys(citizen))
+        # Profiles are append-only: the previous row becomes a tombstone
+        old = self._rows.get(user_id)
+        if old is not None:
+            self._alive[old] = False
+        row = len(self._ids)
+        for key in keys:
+            self._postings.setdefault(key, []).append(row)
+            self._arrays.pop(key, None)
+        self._ids.append(user_id)
+        self._rows[user_id] = row
+        self._alive.append(True)
+        self._citizens.append(citizen)
+        self._arrays.pop(None, None)
+
+        tombstones = len(self._ids) - len(self._rows)
+        if tombstones >= max(self.TOMBSTONE_MIN, self.TOMBSTONE_RATIO * len(self._ids)):
+            self._compact()
+
+        self._log.append((user_id, keys))
+        if len(self._log) > 2 * self.LOG_LIMIT:
+            self._trim_log()
+
+    def _compact(self):
+        """Drop tombstoned rows and renumber the live ones."""
+        alive = np.array(self._alive, dtype=bool)
+        renumber = np.cumsum(alive, dtype=np.int64) - 1
+        for key, posting in list(self._postings.items()):
+            rows = np.array(posting, dtype=np.int64)
+            rows = renumber[rows[alive[rows]]]
+            if len(rows):
+                self._postings[key] = rows.tolist()
+            else:
+                del self._postings[key]
+        self._ids = [user_id for user_id, live in zip(self._ids, self._alive) if live]
+        self._citizens = [c for c, live in zip(self._citizens, self._alive) if live]
+        self._rows = {user_id: row for row, user_id in enumerate(self._ids)}
+        self._alive = [True] * len(self._ids)
+        self._arrays = {}
+        self._stats['compactions'] += 1
+
+    def _trim_log(self):
+        end = self._log_start + len(self._log)
+        for mission_id, entry in list(self._heaps.items()):
+            if entry['seq'] < end - self.LOG_LIMIT:
+                self._drop_heap(mission_id)
+                self._stats['dropped_heaps'] += 1
+        start = min((entry['seq'] for entry in self._heaps.values()), default=end)
+        del self._log[:start - self._log_start]
+        self._log_start = start
+
+    def _drop_heap(self, mission_id):
+        for e in self._heaps.pop(mission_id)['heap']:
+            self._members[e[1]].discard(mission_id)
+
+    def _catch_up(self, mission_id):
+        """Replay the profile updates a mission's heap has not seen yet."""
+        entry = self._heaps[mission_id]
+        pending = self._log[entry['seq'] - self._log_start:]
+        entry['seq'] = self._log_start + len(self._log)
+        # Only a citizen's latest profile matters
+        latest = {user_id: keys for user_id, keys in pending}
+        for user_id, keys in latest.items():
+            if mission_id not in self._heaps:
+                return
+            if user_id in self._rows:
+                self._patch_heap(mission_id, user_id, keys)
+
+    def _patch_heap(self, mission_id, user_id, keys):
+        entry = self._heaps[mission_id]
+        heap = entry['heap']
+        members = self._members.setdefault(user_id, set())
+        candidate = self._entry(entry['groups'], user_id, keys)
+
+        if mission_id in members:
+            old = next(e for e in heap if e[1] == user_id)
+            heap.remove(old)
+            heapq.heapify(heap)
+            heapq.heappush(heap, candidate)
+            if candidate[0] < old[0] and len(self._rows) > self.K:
+                # Someone outside the heap may now outrank this citizen
+                self._drop_heap(mission_id)
+        elif len(heap) < self.K:
+            heapq.heappush(heap, candidate)
+            members.add(mission_id)
+        elif candidate > heap[0]:
+            evicted = heapq.heapreplace(heap, candidate)
+            self._members[evicted[1]].discard(mission_id)
+            members.add(mission_id)
+
+    @staticmethod
+    def _groups(features):
+        weights, _ = MatchEngine.weights(features)
+        groups = {'skill': {}, 'value': {}, 'fit': {}}
+        for key, weight in weights.items():
+            if key.startswith('s:'):
+                groups['skill'][key] = weight
+            elif key.startswith(('v:', 'd:')):
+                groups['value'][key] = weight
+            else:
+                groups['fit'][key] = weight
+        return groups
+
+    @staticmethod
+    def _entry(groups, user_id, keys):
+        parts = [sum(w for k, w in groups[g].items() if k in keys) for g in ('skill', 'value', 'fit')]
+        return CandidateEngine._make_entry(groups, user_id, *parts)
+
+    @staticmethod
+    def _make_entry(groups, user_id, skill, value, fit):
+        score = round(MatchEngine.BASE + skill + value + fit)
+        sm = round(100 * skill / MatchEngine.SKILL_WEIGHT) if groups['skill'] else 0
+        vm = round(100 * value / MatchEngine.VALUE_WEIGHT) if groups['value'] else 0
+        am = round(100 * fit / MatchEngine.FIT_WEIGHT)
+        return (score, user_id, sm, vm, am)
+
+    def _array(self, key):
+        cached = self._arrays.get(key)
+        if cached is None:
+            cached = np.array(self._postings[key] if key else self._alive,
+                              dtype=np.int32 if key else bool)
+            self._arrays[key] = cached
+        return cached
+
+    def _build(self, mission_id, features):
+        groups = self._groups(features)
+        n = len(self._ids)
+        parts = []
+        for name in ('skill', 'value', 'fit'):
+            part = np.zeros(n, dtype=np.float32)
+            for key, weight in groups[name].items():
+                if key in self._postings:
+                    part[self._array(key)] += weight
+            parts.append(part)
+        total = parts[0] + parts[1] + parts[2]
+        total[~self._array(None)] = -1
+
+        k = min(self.K, int(self._array(None).sum()))
+        rows = np.argpartition(total, n - k)[n - k:] if k else []
+        heap = [self._make_entry(groups, self._ids[r], float(parts[0][r]),
+                                 float(parts[1][r]), float(parts[2][r]))
+                for r in rows]
+        heapq.heapify(heap)
+        for e in heap:
+            self._members.setdefault(e[1], set()).add(mission_id)
+        self._heaps[mission_id] = {'groups': groups, 'heap': heap,
+                                   'seq': self._log_start + len(self._log)}
+
+    def top(self, mission_id, features, n=10):
+        """Return the n best (score, user_id, sm, vm, am) for a mission."""
+        with self._lock:
+            if mission_id in self._heaps:
+                self._catch_up(mission_id)
+            if mission_id not in self._heaps:
+                self._build(mission_id, features)
+            return heapq.nlargest(n, self._heaps[mission_id]['heap'])
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, rows=len(self._ids), citizens=len(self._rows),
+                        heaps=len(self._heaps), log=len(self._log))
+
+match_engine = MatchEngine()
+candidate_engine = CandidateEngine()
+
+# ============= MISSION CATALOG =============
+# /api/missions fields served from the catalog, in the (sorted) key order
+# jsonify would give them; score and reasons are computed per request
+CATALOG_FIELDS = ['created_at', 'description', 'emoji', 'id', 'impact', 'meta', 'org', 'tags', 'title']
+CATALOG_INDEX = {field: i for i, field in enumerate(CATALOG_FIELDS)}
+# Members that repeat across missions and are stored once
+CATALOG_SHARED = ('org', 'emoji', 'tags', 'meta')
+
+def json_member(key, value):
+    """Encode one "key":value object member the way jsonify does."""
+    return ('"%s":%s' % (key, json.dumps(value, sort_keys=True, separators=(',', ':')))).encode()
+
+class MissionRecord:
+    """An active mission as pre-encoded JSON object members, aligned with
+    CATALOG_FIELDS."""
+    __slots__ = ('id', 'created_at', 'members')
+
+    def __init__(self, mission_id, created_at, members):
+        self.id = mission_id
+        self.created_at = created_at
+        self.members = members
+
+class CatalogSnapshot:
+    """Immutable view of the catalog: records by id, and their
+    (created_at, id) keys in ascending order for keyset pagination."""
+    __slots__ = ('records', 'keys', 'max_id')
+
+    def __init__(self, records, keys, max_id):
+        self.records = records
+        self.keys = keys
+        self.max_id = max_id
+
+    def page(self, limit, before=None, only=None):
+        """Up to `limit` records newest first, older than the (created_at,
+        id) key `before`, restricted to the ids in `only`; and whether more
+        remain."""
+        if only is None:
+            keys = self.keys
+        else:
+            keys = sorted((self.records[i].created_at, i) for i in only if i in self.records)
+        end = bisect.bisect_left(keys, before) if before is not None else len(keys)
+        chosen = keys[max(0, end - limit - 1):end][::-1]
+        return [self.records[mission_id] for _, mission_id in chosen[:limit]], len(chosen) > limit
+
+class MissionCatalog:
+    """In-process read model of the active missions behind /api/missions.
+
+    Readers take the current CatalogSnapshot without locking and never see
+    it change. refresh() pulls missions written since the last one (by any
+    worker process), builds a new snapshot from a copy of the current one
+    and swaps it in with a single assignment. Like MatchEngine it relies on
+    missions being insert-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shared = {}
+        self._bytes = 0
+        self.snapshot = CatalogSnapshot({}, [], 0)
+
+    def refresh(self, db):
+        """Return the current snapshot, after adding any new missions."""
+        columns = ['m.id', 'm.created_at']
+        for field in CATALOG_FIELDS:
+            columns.extend(c for c in MISSION_FIELDS[field] if c not in columns)
+        rows = db.execute('''
+            SELECT %s
+            FROM missions m
+            LEFT JOIN associations a ON m.association_id = a.id
+            WHERE m.id > ? AND +m.status = 'active'
+            ORDER BY m.id
+        ''' % ', '.join(columns), (self.snapshot.max_id,)).fetchall()
+        if not rows:
+            return self.snapshot
+
+        with self._lock:
+            current = self.snapshot
+            fresh = [self._record(m) for m in rows if m['id'] > current.max_id]
+            if not fresh:
+                return current
+            records = dict(current.records)
+            records.update((r.id, r) for r in fresh)
+            added = sorted((r.created_at, r.id) for r in fresh)
+            keys = current.keys + added
+            if current.keys and added[0] < current.keys[-1]:
+                keys.sort()
+            self.snapshot = CatalogSnapshot(records, keys, fresh[-1].id)
+            return self.snapshot
+
+    def _record(self, m):
+        values = mission_to_dict(m, CATALOG_FIELDS, None, None)
+        members = []
+        for field in CATALOG_FIELDS:
+            member = json_member(field, values[field])
+            if field in CATALOG_SHARED:
+                shared = self._shared.setdefault(member, member)
+                if shared is member:
+                    self._bytes += sys.getsizeof(member)
+                member = shared
+            else:
+                self._bytes += sys.getsizeof(member)
+            members.append(member)
+        record = MissionRecord(m['id'], sys.intern(m['created_at']), tuple(members))
+        self._bytes += sys.getsizeof(record) + sys.getsizeof(record.members)
+        return record
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            'missions': len(snapshot.records),
+            'bytes': self._bytes,
+            'shared_members': len(self._shared)
+        }
+
+def render_missions(records, fields, scored):
+    """Serialize records as a JSON array of the requested fields by joining
+    their pre-encoded members. `scored` maps ids to (score, reasons)."""
+    fields = sorted(fields)
+    items = []
+    for record in records:
+        score, reasons = scored.get(record.id, (MatchEngine.BASE, []))
+        members = []
+        for field in fields:
+            if field == 'score':
+                members.append(b'"score":%d' % score)
+            elif field == 'reasons':
+                members.append(json_member('reasons', reasons))
+            else:
+                members.append(record.members[CATALOG_INDEX[field]])
+        items.append(b'{' + b','.join(members) + b'}')
+    return app.response_class(b'[' + b','.join(items) + b']\n', mimetype='application/json')
+
+mission_catalog = MissionCatalog()
+
+# ============= RESPONSE CACHE =============
+def current_data_version(db):
+    """Return (version, modified_at) of the catalog. Every write path bumps
+    it in its own transaction, so all worker processes agree on it."""
+    row = db.execute(
+        "SELECT version, modified_at FROM data_versions WHERE name = 'catalog'"
+    ).fetchone()
+    return row['version'], row['modified_at']
+
+def bump_data_version(db):
+    db.execute(
+        "UPDATE data_versions SET version = version + 1, modified_at = ? WHERE name = 'catalog'",
+        (int(time.time()),)
+    )
+
+def touch_profile(db, user_id):
+    """Stamp a user row with the current catalog version after a bump."""
+    db.execute('''
+        UPDATE users SET profile_rev = (
+            SELECT version FROM data_versions WHERE name = 'catalog'
+        ) WHERE id = ?
+    ''', (user_id,))
+
+class ResponseCache:
+    """LRU of serialized GET responses bounded by a TTL and a byte budget."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry['body'])
+        if size > self.max_bytes:
+            return
+        entry['expires'] = time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['body'])
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_BYTES'], app.config['RESPONSE_CACHE_TTL'])
+
+def cached_get(view):
+    """Serve a GET view from the response cache.
+
+    Entries are keyed by path, query string, caller and catalog version, so
+    any write invalidates them implicitly. Responses carry a strong ETag and
+    Last-Modified and answer conditional requests with a 304.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with get_db() as db:
+            version, modified_at = current_data_version(db)
+        key = (request.path, request.query_string, get_token_user_id(), version)
+
+        entry = response_cache.get(key)
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            entry = {
+                'body': body,
+                'etag': hashlib.sha256(body).hexdigest()[:32],
+                'mimetype': response.mimetype,
+                'headers': [(k, v) for k, v in response.headers
+                            if k.lower().startswith('x-')]
+            }
+            response_cache.put(key, entry)
+
+        response = app.response_class(entry['body'], mimetype=entry['mimetype'])
+        response.headers.extend(entry['headers'])
+        response.set_etag(entry['etag'])
+        response.last_modified = modified_at
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Authorization')
+        return response.make_conditional(request)
+    return wrapper
+
+# ============= JOB QUEUE =============
+# Lanes map to priorities, lower first. With several workers per process
+# the first one only serves the interactive lane, so batch work never
+# delays a user waiting on a result.
+JOB_LANES = {'interactive': 0, 'batch': 10}
+JOB_PENDING = ('queued', 'running')
+job_handlers = {}
+
+def job_handler(kind):
+    """Register the function that runs jobs of a kind: it takes the job's
+    payload and returns a JSON-serializable result."""
+    def register(fn):
+        job_handlers[kind] = fn
+        return fn
+    return register
+
+def job_to_dict(row):
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'result': json.loads(row['result']) if row['result'] is not None else None,
+        'error': row['error'] if row['status'] == 'failed' else None
+    }
+
+class JobQueue:
+    """Durable work queue over the jobs table, drained by a few worker
+    threads in every process.
+
+    Enqueueing is an INSERT in the caller's transaction, so jobs survive
+    restarts and any worker process may run them. A worker claims the most
+    urgent due job with one UPDATE ... RETURNING under SQLite's write lock
+    and holds it on a lease; the jobs of a worker that died go back to the
+    queue when their lease expires. Failures are retried with exponential
+    backoff. While a job is pending, enqueueing its dedup key again returns
+    the same job.
+    """
+
+    def __init__(self, workers, poll_interval, lease, max_attempts, retry_delay, retention):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._finished = threading.Condition()
+        self._maintain_at = 0
+        self._running = 0
+        self._stats = {'enqueued': 0, 'deduplicated': 0, 'completed': 0, 'retried': 0, 'failed': 0}
+
+    def enqueue(self, db, kind, payload, key=None, lane='interactive', user_id=None, run_at=None):
+        """Add a job in the caller's transaction and return its id, or the
+        id of the pending job with the same key. Call notify() after the
+        commit to start it right away."""
+        job_id = uuid.uuid4().hex
+        row = db.execute('''
+            INSERT INTO jobs (id, kind, dedup_key, priority, payload, user_id, max_attempts, run_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dedup_key) WHERE status IN ('queued', 'running')
+            DO UPDATE SET dedup_key = excluded.dedup_key
+            RETURNING id
+        ''', (job_id, kind, key, JOB_LANES[lane], json.dumps(payload, ensure_ascii=False),
+              user_id, self.max_attempts, run_at or time.time())).fetchone()
+        with self._lock:
+            self._stats['enqueued' if row['id'] == job_id else 'deduplicated'] += 1
+        return row['id']
+
+    def notify(self):
+        self._wake.set()
+
+    def claim(self, db, max_priority):
+        now = time.time()
+        # Look first with a read, so idle workers never take the write lock
+        due = db.execute('''
+            SELECT 1 FROM jobs WHERE status = 'queued' AND priority <= ? AND run_at <= ? LIMIT 1
+        ''', (max_priority, now)).fetchone()
+        if due is None:
+            return None
+        with db:
+            rows = db.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND priority <= ? AND run_at <= ?
+                    ORDER BY priority, run_at
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+            ''', (now + self.lease, max_priority, now)).fetchall()
+        return rows[0] if rows else None
+
+    def maintain(self, db):
+        """Requeue jobs whose lease expired and drop old finished ones."""
+        now = time.time()
+        with db:
             db.execute('''
-                INSERT INTO associations (user_id, name, description, verified, impact_score)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                assoc_user_id, 
-                'Greenpeace Maroc', 
-                'Protection de l\'environnement et sensibilisation climatique', 
-                1, 
-                92
-            ))
-            
-            assoc_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
-            
-            # Create demo citizen user
+                UPDATE jobs SET
+                    status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END,
+                    error = 'Worker lost', locked_until = NULL
+                WHERE status = 'running' AND locked_until < ?
+            ''', (now, now))
+            db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (now - self.retention,)
+            )
+
+    def execute(self, job):
+        handler = job_handlers.get(job['kind'])
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            with app.app_context():
+                try:
+                    if handler is None:
+                        raise LookupError('No handler for %s jobs' % job['kind'])
+                    result = json.dumps(handler(json.loads(job['payload'])), ensure_ascii=False)
+                except Exception as e:
+                    app.logger.exception('Job %s (%s) failed', job['id'], job['kind'])
+                    status = self._fail(get_db(), job, repr(e))
+                else:
+                    status = 'done'
+                    with get_db() as db:
+                        db.execute('''
+                            UPDATE jobs SET status = 'done', result = ?, error = NULL,
+                                locked_until = NULL, finished_at = ?
+                            WHERE id = ?
+                        ''', (result, time.time(), job['id']))
+        finally:
+            with self._lock:
+                self._running -= 1
+        job_seconds.observe((job['kind'], status), time.perf_counter() - started)
+        with self._lock:
+            self._stats[{'done': 'completed', 'queued': 'retried', 'failed': 'failed'}[status]] += 1
+        with self._finished:
+            self._finished.notify_all()
+
+    def _fail(self, db, job, error):
+        now = time.time()
+        with db:
+            if job['attempts'] < job['max_attempts']:
+                db.execute('''
+                    UPDATE jobs SET status = 'queued', error = ?, locked_until = NULL, run_at = ?
+                    WHERE id = ?
+                ''', (error, now + self.retry_delay * 2 ** (job['attempts'] - 1), job['id']))
+                return 'queued'
             db.execute('''
-                INSERT INTO users (email, password, user_type, name, city, age, job, skills, user_values, availability, profile_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                'amira@example.com',
-                hashlib.sha256('demo123'.encode()).hexdigest(),
-                'citizen',
-                'Amira Benali',
-                'Tunis',
-                24,
-                'Designer UX',
-                json.dumps(['Design UX/UI', 'Communication', 'Social Media']),
-                json.dumps(['🌱 Environnement', '📚 Éducation']),
-                json.dumps(['Lundi soir', 'Mercredi soir', 'Télétravail OK']),
-                85
-            ))
-            
-            # Create sample missions
-            missions = [
-                (
-                    'Chargé·e de communication digitale', 
-                    '🌊', 
-                    'Gérer les réseaux sociaux de la campagne "Océans Propres" pour toucher +10K personnes.',
-                    'À distance', 
-                    '8h/mois', 
-                    0,
-                    json.dumps([{'t': 'Social Media', 'c': 's'}, {'t': 'Rédaction', 'c': 's'}]),
-                    json.dumps([{'t': 'Créativité', 'c': 'v'}, {'t': 'Autonomie', 'c': 'v'}])
-                ),
-                (
-                    'Designer de contenus', 
-                    '🎨', 
-                    'Créer des visuels pour sensibiliser 5000 personnes aux droits de l\'enfant.',
-                    'À distance', 
-                    '5h/mois', 
-                    1,
-                    json.dumps([{'t': 'Design UX', 'c': 's'}, {'t': 'Photoshop', 'c': 's'}]),
-                    json.dumps([{'t': 'Créativité', 'c': 'v'}, {'t': 'Empathie', 'c': 'v'}])
-                ),
-                (
-                    'Mentor informatique pour ados', 
-                    '💻', 
-                    'Accompagner 8 jeunes (12-17 ans) dans l\'apprentissage du code',
-                    'Tunis El Menzah', 
-                    '4h/mois', 
-                    1,
-                    json.dumps([{'t': 'Dev Web', 'c': 's'}, {'t': 'Python', 'c': 's'}]),
-                    json.dumps([{'t': 'Pédagogie', 'c': 'v'}, {'t': 'Patience', 'c': 'v'}])
+                UPDATE jobs SET status = 'failed', error = ?, locked_until = NULL, finished_at = ?
+                WHERE id = ?
+            ''', (error, now, job['id']))
+            return 'failed'
+
+    def work(self, max_priority):
+        while True:
+            job = None
+            try:
+                db = db_pool.acquire()
+                try:
+                    if time.monotonic() >= self._maintain_at:
+                        self._maintain_at = time.monotonic() + 60
+                        self.maintain(db)
+                    job = self.claim(db, max_priority)
+                finally:
+                    db_pool.release(db)
+            except Exception:
+                app.logger.exception('Job queue poll failed')
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                self.execute(job)
+            except Exception:
+                # Its lease runs out and the job goes back to the queue
+                app.logger.exception('Could not record the outcome of job %s', job['id'])
+
+    def start(self):
+        for n in range(self.workers):
+            lane = 'interactive' if n == 0 and self.workers > 1 else 'batch'
+            threading.Thread(target=self.work, args=(JOB_LANES[lane],),
+                             name='job-worker-%d' % n, daemon=True).start()
+
+    def wait(self, job_id, timeout):
+        """Return the job's row once it has finished or after `timeout`
+        seconds, whichever comes first; None if there is no such job."""
+        deadline = time.monotonic() + timeout
+        while True:
+            db = db_pool.acquire()
+            try:
+                row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            finally:
+                db_pool.release(db)
+            remaining = deadline - time.monotonic()
+            if row is None or row['status'] not in JOB_PENDING or remaining <= 0:
+                return row
+            # Local completions wake us at once, other processes' on the next poll
+            with self._finished:
+                self._finished.wait(min(remaining, self.poll_interval))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, running=self._running)
+
+job_queue = JobQueue(
+    app.config['JOB_WORKERS'],
+    app.config['JOB_POLL_INTERVAL'],
+    app.config['JOB_LEASE'],
+    app.config['JOB_MAX_ATTEMPTS'],
+    app.config['JOB_RETRY_DELAY'],
+    app.config['JOB_RETENTION']
+)
+
+def job_response(kind, payload, lane='interactive', user_id=None):
+    """Queue a job for a request and answer 202 with it. Identical pending
+    requests share one job."""
+    key = '%s:%s' % (kind, AIGateway.cache_key(kind, payload))
+    with get_db() as db:
+        job_id = job_queue.enqueue(db, kind, payload, key, lane, user_id)
+        row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    job_queue.notify()
+    response = jsonify(job_to_dict(row))
+    response.status_code = 202
+    response.headers['Location'] = '/api/jobs/' + job_id
+    return response
+
+# ============= DASHBOARD STATS =============
+# association_stats is maintained by these triggers on every write to
+# missions and associations, and by the candidate_stats job whenever an
+# association's candidates may have changed, so reading a dashboard is
+# one row.
+STATS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_association_insert
+    AFTER INSERT ON associations
+    BEGIN
+        INSERT OR IGNORE INTO association_stats (association_id) VALUES (NEW.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_mission_insert
+    AFTER INSERT ON missions
+    BEGIN
+        INSERT OR IGNORE INTO association_stats (association_id) VALUES (NEW.association_id);
+        UPDATE association_stats SET
+            active_missions = active_missions + (NEW.status = 'active'),
+            people_impacted = people_impacted
+                + CASE WHEN NEW.status = 'active' THEN IFNULL(NEW.people_reached, 0) ELSE 0 END
+        WHERE association_id = NEW.association_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_mission_update
+    AFTER UPDATE OF status, people_reached, association_id ON missions
+    BEGIN
+        UPDATE association_stats SET
+            active_missions = active_missions - (OLD.status = 'active'),
+            people_impacted = people_impacted
+                - CASE WHEN OLD.status = 'active' THEN IFNULL(OLD.people_reached, 0) ELSE 0 END
+        WHERE association_id = OLD.association_id;
+        INSERT OR IGNORE INTO association_stats (association_id) VALUES (NEW.association_id);
+        UPDATE association_stats SET
+            active_missions = active_missions + (NEW.status = 'active'),
+            people_impacted = people_impacted
+                + CASE WHEN NEW.status = 'active' THEN IFNULL(NEW.people_reached, 0) ELSE 0 END
+        WHERE association_id = NEW.association_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_mission_delete
+    AFTER DELETE ON missions
+    BEGIN
+        UPDATE association_stats SET
+            active_missions = active_missions - (OLD.status = 'active'),
+            people_impacted = people_impacted
+                - CASE WHEN OLD.status = 'active' THEN IFNULL(OLD.people_reached, 0) ELSE 0 END
+        WHERE association_id = OLD.association_id;
+    END
+    '''
+]
+
+# Counters recomputed from scratch, column-for-column with STATS_COLUMNS
+STATS_COLUMNS = 'association_id, active_missions, people_impacted'
+FRESH_STATS_SQL = '''
+    SELECT
+        a.id,
+        IFNULL(ms.active, 0),
+        IFNULL(ms.people, 0)
+    FROM associations a
+    LEFT JOIN (
+        SELECT association_id,
+               SUM(status = 'active') AS active,
+               SUM(CASE WHEN status = 'active' THEN IFNULL(people_reached, 0) ELSE 0 END) AS people
+        FROM missions GROUP BY association_id
+    ) ms ON ms.association_id = a.id
+'''
+
+def reconcile_association_stats(db):
+    """Rewrite counters that drifted from the source tables; returns how
+    many association rows had to be corrected."""
+    drift = db.execute(
+        'SELECT COUNT(*) FROM (%s EXCEPT SELECT %s FROM association_stats)'
+        % (FRESH_STATS_SQL, STATS_COLUMNS)
+    ).fetchone()[0]
+    if drift:
+        db.execute('''
+            INSERT INTO association_stats (%s)
+            %s WHERE 1
+            ON CONFLICT (association_id) DO UPDATE SET
+                active_missions = excluded.active_missions,
+                people_impacted = excluded.people_impacted
+        ''' % (STATS_COLUMNS, FRESH_STATS_SQL))
+    return drift
+
+def queue_candidate_stats(db, association_ids):
+    """Queue a recount of the candidates of these associations in the
+    caller's transaction; call job_queue.notify() after the commit."""
+    for association_id in association_ids:
+        job_queue.enqueue(db, 'candidate_stats', {'association_id': association_id},
+                          key='candidate_stats:%d' % association_id, lane='batch')
+
+@job_handler('candidate_stats')
+def run_candidate_stats(payload):
+    """Count the distinct citizens of an association's default
+    /api/candidates list: all of them, those not reviewed yet, and the
+    mean of their best scores as match_rate."""
+    association_id = payload['association_id']
+    with get_db() as db:
+        ranked = association_candidates(db, association_id, app.config['CANDIDATES_PER_MISSION'])
+        best = {}
+        for _, _, (score, user_id, _, _, _) in ranked:
+            best[user_id] = max(best.get(user_id, 0), score)
+        statuses = candidate_statuses(db, list(best)) if best else {}
+        reviewed = {entry[1] for m, _, entry in ranked
+                    if statuses.get((m['id'], entry[1]), 'pending') != 'pending'}
+        counters = (
+            len(best),
+            len(best.keys() - reviewed),
+            round(sum(best.values()) / len(best)) if best else 0
+        )
+        previous = db.execute('''
+            SELECT total_candidates, new_candidates, match_rate FROM association_stats
+            WHERE association_id = ?
+        ''', (association_id,)).fetchone()
+        db.execute('''
+            UPDATE association_stats
+            SET total_candidates = ?, new_candidates = ?, match_rate = ?, candidates_counted_at = ?
+            WHERE association_id = ?
+        ''', counters + (time.time(), association_id))
+        if previous is not None and tuple(previous) != counters:
+            bump_data_version(db)
+    return dict(zip(('total_candidates', 'new_candidates', 'match_rate'), counters))
+
+@job_handler('reconcile_stats')
+def run_stats_reconciliation(payload):
+    with get_db() as db:
+        drift = reconcile_association_stats(db)
+        if drift:
+            bump_data_version(db)
+    if drift:
+        app.logger.warning('Reconciled drifted stats for %d associations', drift)
+    return {'drift': drift}
+
+def run_stats_reconciler(interval):
+    """Schedule a reconciliation at every multiple of `interval`. All
+    processes schedule it, and the dedup key leaves one job per slot."""
+    while True:
+        run_at = (time.time() // interval + 1) * interval
+        try:
+            with app.app_context():
+                with get_db() as db:
+                    job_queue.enqueue(db, 'reconcile_stats', {}, key='reconcile_stats:%d' % run_at,
+                                      lane='batch', run_at=run_at)
+        except Exception:
+            app.logger.exception('Could not schedule stats reconciliation')
+        time.sleep(max(run_at - time.time(), 0) + 1)
+
+_background_lock = threading.Lock()
+_background_pid = None
+
+@app.before_request
+def start_background_jobs():
+    """Start this process's background threads on its first request, so
+    each forked worker gets its own."""
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        ensure_database()
+        _background_pid = os.getpid()
+        threading.Thread(
+            target=run_stats_reconciler,
+            args=(app.config['STATS_RECONCILE_INTERVAL'],),
+            name='stats-reconciler',
+            daemon=True
+        ).start()
+        threading.Thread(
+            target=event_broker.run,
+            args=(app.config['EVENT_POLL_INTERVAL'], app.config['EVENT_RETENTION']),
+            name='event-feed',
+            daemon=True
+        ).start()
+        job_queue.start()
+
+# ============= PASSWORD HASHING =============
+def _scrypt_call(password, salt, n, r, p):
+    """(function, args, kwargs) deriving a key. The function is hashlib's
+    own, so hash processes unpickle it without importing this module."""
+    # 128 * n * r bytes plus slack must fit maxmem
+    return hashlib.scrypt, (password.encode(),), {
+        'salt': salt, 'n': n, 'r': r, 'p': p,
+        'maxmem': 256 * n * r + 1024 * 1024, 'dklen': 32
+    }
+
+# Hash processes start from a clean forkserver rather than as forks of a
+# server process, so they never hold its listening socket or run its
+# signal handlers. Like every non-fork start method they import the main
+# module, which the forkserver preloads once for all of them.
+HASH_MP_CONTEXT = multiprocessing.get_context('forkserver')
+
+class PasswordHasher:
+    """Salted scrypt hashing on a bounded process pool.
+
+    Hashes are stored as self-describing 'scrypt$n=..,r=..,p=..$salt$hash'
+    strings, so cost parameters can be raised at any time: verify() reports
+    when a stored hash (including a legacy unsalted sha256 hex digest) is
+    weaker than the current settings and should be rewritten.
+    """
+
+    def __init__(self, n, r, p, workers, max_pending):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._latencies = deque(maxlen=1024)
+        self._stats = {'hashes': 0, 'rehashes': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+
+    def _executor(self):
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=HASH_MP_CONTEXT
                 )
-            ]
-            
-            for title, emoji, impact, location, commitment, urgent, skills, tags in missions:
-                db.execute('''
-                    INSERT INTO missions (association_id, title, emoji, impact_description, location, commitment, urgent, skills_required, tags)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (assoc_id, title, emoji, impact, location, commitment, urgent, skills, tags))
-            
-            print("✅ Sample data inserted successfully!")
+                self._pool_pid = os.getpid()
+            return self._pool
 
-# Initialize database
-init_db()
+    def shutdown(self):
+        """Stop this process's hash processes, waiting for running hashes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            if self._pool_pid != os.getpid():
+                return
+            self._pool_pid = None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
 
-# ============= AI SERVICE =============
-class AIService:
-    @staticmethod
-    def analyze_profile(profile_data):
-        """Analyze citizen profile and return insights"""
-        skills_count = len(profile_data.get('skills', []))
-        values_count = len(profile_data.get('values', []))
-        availability_count = len(profile_data.get('availability', []))
-        
-        # Calculate score
-        score = min(100, 60 + skills_count * 5 + values_count * 3 + availability_count * 2)
-        
-        # Generate recommendations
-        domains = []
-        for v in profile_data.get('values', []):
-            if 'environ' in v.lower():
-                domains.append("🌱 Environnement")
-            elif 'éduc' in v.lower() or 'educ' in v.lower():
-                domains.append("📚 Éducation")
-            elif 'santé' in v.lower():
-                domains.append("⚕️ Santé")
-            elif 'justice' in v.lower():
-                domains.append("⚖️ Justice sociale")
-            elif 'culture' in v.lower():
-                domains.append("🎨 Culture")
-            elif 'numéri' in v.lower():
-                domains.append("💻 Numérique")
-        
-        # Remove duplicates and limit to 3
-        domains = list(dict.fromkeys(domains))[:3]
-        if not domains:
-            domains = ["🌱 Environnement", "📚 Éducation", "💻 Numérique"][:min(3, skills_count)]
-        
-        # Soft skills based on job/age
-        soft_skills = []
-        if skills_count > 2:
-            soft_skills.extend(["Communication", "Créativité"])
-        if values_count > 1:
-            soft_skills.append("Empathie")
-        if availability_count > 2:
-            soft_skills.append("Organisation")
-        
-        return {
-            "score": score,
-            "recommendations": domains,
-            "soft_skills": soft_skills[:3],
-            "advice": "Complète ton profil avec tes disponibilités pour des matchs encore plus précis !",
-            "domains": domains
-        }
-    
-    @staticmethod
-    def generate_mission_from_text(text):
-        """Generate mission from natural language"""
-        text_lower = text.lower()
-        
-        if any(word in text_lower for word in ['design', 'graphiste', 'visuel', 'créatif']):
-            return {
-                "title": "Designer créatif pour campagne impactante",
-                "emoji": "🎨",
-                "impact": "Créer des visuels qui sensibiliseront 5000 personnes à notre cause",
-                "tags": [
-                    {"t": "Design", "c": "mts"},
-                    {"t": "Créativité", "c": "mtso"},
-                    {"t": "5h/semaine", "c": "mtl"}
-                ],
-                "commitment": "Moyen - 5h/semaine en télétravail",
-                "profiles": "32 profils",
-                "attract": "87%",
-                "matches": "8 matchs"
-            }
-        elif any(word in text_lower for word in ['communica', 'réseaux', 'social', 'media', 'content']):
-            return {
-                "title": "Community manager pour ONG",
-                "emoji": "📱",
-                "impact": "Animer les réseaux sociaux pour toucher 10K personnes",
-                "tags": [
-                    {"t": "Social Media", "c": "mts"},
-                    {"t": "Rédaction", "c": "mtso"},
-                    {"t": "3h/semaine", "c": "mtl"}
-                ],
-                "commitment": "Léger - 3h/semaine",
-                "profiles": "45 profils",
-                "attract": "92%",
-                "matches": "12 matchs"
-            }
-        elif any(word in text_lower for word in ['code', 'dev', 'programmation', 'informatique']):
-            return {
-                "title": "Mentor en programmation pour jeunes",
-                "emoji": "💻",
-                "impact": "Former 20 jeunes aux bases du développement web",
-                "tags": [
-                    {"t": "Dev Web", "c": "mts"},
-                    {"t": "Pédagogie", "c": "mtso"},
-                    {"t": "4h/semaine", "c": "mtl"}
-                ],
-                "commitment": "Moyen - 4h/semaine",
-                "profiles": "28 profils",
-                "attract": "84%",
-                "matches": "6 matchs"
-            }
-        elif any(word in text_lower for word in ['atelier', 'formation', 'enseigner', 'éduc']):
-            return {
-                "title": "Formateur·rice pour ateliers éducatifs",
-                "emoji": "📚",
-                "impact": "Animer des ateliers pour 30 enfants de quartiers défavorisés",
-                "tags": [
-                    {"t": "Formation", "c": "mts"},
-                    {"t": "Pédagogie", "c": "mtso"},
-                    {"t": "Week-end", "c": "mtl"}
-                ],
-                "commitment": "Occasionnel - 2 samedis/mois",
-                "profiles": "38 profils",
-                "attract": "89%",
-                "matches": "10 matchs"
-            }
+    def _derive(self, password, salt, n, r, p, in_process=False):
+        started = time.perf_counter()
+        function, args, kwargs = _scrypt_call(password, salt, n, r, p)
+        if in_process:
+            digest = function(*args, **kwargs)
         else:
-            return {
-                "title": "Mission de bénévolat",
-                "emoji": "🤝",
-                "impact": "Contribuer à une cause importante selon vos compétences",
-                "tags": [
-                    {"t": "Polyvalence", "c": "mtso"},
-                    {"t": "Flexible", "c": "mtl"}
-                ],
-                "commitment": "Flexible - selon disponibilités",
-                "profiles": "28 profils",
-                "attract": "75%",
-                "matches": "5 matchs"
-            }
+            with self._slots:
+                digest = self._executor().submit(function, *args, **kwargs).result()
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._latencies.append(elapsed)
+            self._stats['hashes'] += 1
+            self._stats['total_ms'] += elapsed
+            self._stats['max_ms'] = max(self._stats['max_ms'], elapsed)
+        return digest
+
+    def hash(self, password, in_process=False):
+        """Hash a password. `in_process` skips the pool, for seeding many
+        accounts at import time, where a pool round trip per hash would
+        dominate."""
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.n, self.r, self.p, in_process)
+        return 'scrypt$n=%d,r=%d,p=%d$%s$%s' % (
+            self.n, self.r, self.p,
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode()
+        )
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash) for a stored hash."""
+        if not stored.startswith('scrypt$'):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy.encode(), stored.encode()), True
+        try:
+            _, params, salt, digest = stored.split('$')
+            params = dict(item.split('=') for item in params.split(','))
+            n, r, p = int(params['n']), int(params['r']), int(params['p'])
+            salt, digest = base64.b64decode(salt), base64.b64decode(digest)
+        except (ValueError, KeyError):
+            return False, False
+        matches = hmac.compare_digest(self._derive(password, salt, n, r, p), digest)
+        return matches, (n, r, p) != (self.n, self.r, self.p)
+
+    def record_rehash(self):
+        with self._lock:
+            self._stats['rehashes'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        stats['total_ms'] = round(stats['total_ms'], 3)
+        stats['max_ms'] = round(stats['max_ms'], 3)
+        for name, q in (('p50_ms', 0.5), ('p99_ms', 0.99)):
+            stats[name] = round(latencies[int(q * (len(latencies) - 1))], 3) if latencies else None
+        stats['params'] = {'n': self.n, 'r': self.r, 'p': self.p, 'workers': self.workers}
+        return stats
+
+password_hasher = PasswordHasher(
+    n=app.config['PASSWORD_SCRYPT_N'],
+    r=app.config['PASSWORD_SCRYPT_R'],
+    p=app.config['PASSWORD_SCRYPT_P'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING']
+)
+
+# ============= AUTH =============
+class TokenCache:
+    """Bounded LRU of verified JWT claims keyed by a digest of the token.
+
+    Entries expire with the token's own `exp`, so a cached token is never
+    accepted for longer than jwt.decode would have accepted it.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'rejected': 0}
+
+    def verify(self, token):
+        """Return the claims of a valid token, or None."""
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        try:
+            claims = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+            claims['user_id']
+        except (jwt.InvalidTokenError, KeyError):
+            with self._lock:
+                self._stats['rejected'] += 1
+            return None
+
+        with self._lock:
+            self._entries[key] = (claims, claims.get('exp', now + 60))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+token_cache = TokenCache(app.config['TOKEN_CACHE_SIZE'])
+
+def current_claims():
+    """Claims of the request's bearer token, verified once per request."""
+    if '_claims' not in g:
+        parts = request.headers.get('Authorization', '').split(' ')
+        g._claims = token_cache.verify(parts[1]) if len(parts) == 2 else None
+    return g._claims
+
+def get_token_user_id():
+    """Return the user id of an optional bearer token, or None."""
+    claims = current_claims()
+    return claims['user_id'] if claims else None
+
+def current_user():
+    """The caller's users row joined with their association id, loaded once
+    per request. None for anonymous callers or deleted users."""
+    if '_user' not in g:
+        user_id = get_token_user_id()
+        g._user = None
+        if user_id is not None:
+            g._user = get_db().execute('''
+                SELECT u.*, a.id AS association_id
+                FROM users u
+                LEFT JOIN associations a ON a.user_id = u.id
+                WHERE u.id = ?
+            ''', (user_id,)).fetchone()
+    return g._user
+
+def require_auth(view):
+    """Reject requests without a valid bearer token for an existing user."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not request.headers.get('Authorization'):
+            return jsonify({'error': 'No token provided'}), 401
+        if current_claims() is None or current_user() is None:
+            return jsonify({'error': 'Invalid token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+# ============= EVENT STREAM =============
+# Fields of the mission deltas pushed to /api/stream subscribers
+EVENT_MISSION_FIELDS = ['id', 'org', 'title', 'emoji', 'impact', 'tags', 'meta']
+
+def emit_event(db, kind, payload, audience=None):
+    """Append an event to the change feed inside the caller's transaction,
+    so it becomes visible exactly when the change it describes commits.
+    `audience` restricts delivery to a list of association ids."""
+    db.execute(
+        'INSERT INTO events (kind, audience, payload) VALUES (?, ?, ?)',
+        (kind, json.dumps(sorted(audience)) if audience is not None else None,
+         json.dumps(payload, ensure_ascii=False))
+    )
+
+def emit_mission_events(db, mission_ids):
+    """Publish new missions as a delta, or as a plain 'catalog' notice when
+    a bulk chunk is too large to push to every subscriber."""
+    if len(mission_ids) > app.config['EVENT_MAX_MISSIONS']:
+        emit_event(db, 'catalog', {'imported': len(mission_ids)})
+        return
+    columns = []
+    for field in EVENT_MISSION_FIELDS:
+        columns.extend(c for c in MISSION_FIELDS[field] if c not in columns)
+    rows = db.execute('''
+        SELECT %s FROM missions m
+        LEFT JOIN associations a ON m.association_id = a.id
+        WHERE m.id BETWEEN ? AND ?
+    ''' % ', '.join(columns), (min(mission_ids), max(mission_ids))).fetchall()
+    emit_event(db, 'missions', [
+        mission_to_dict(m, EVENT_MISSION_FIELDS, MatchEngine.BASE, []) for m in rows
+    ])
+
+def emit_candidate_event(db, user):
+    """Tell the associations with an active mission sharing a skill or value
+    term with an updated citizen profile to refresh their candidates, and
+    return their ids."""
+    citizen = citizen_features(user)
+    terms = [('s', t) for t in citizen['skill_tokens']]
+    for value in citizen['values'] | citizen['domains']:
+        terms.extend(('v', t) for t in term_tokens(value))
+    terms = set(terms)
+    if not terms:
+        return []
+    # Walk the postings of the profile's terms; SQLite would otherwise probe
+    # every mission against the whole term list
+    audience = [row[0] for row in db.execute('''
+        WITH profile (kind, term) AS (VALUES %s)
+        SELECT DISTINCT m.association_id
+        FROM profile
+        CROSS JOIN mission_terms t ON t.kind = profile.kind AND t.term = profile.term
+        CROSS JOIN missions m ON m.id = t.mission_id
+        WHERE m.status = 'active'
+    ''' % ', '.join(['(?, ?)'] * len(terms)), [x for term in terms for x in term])]
+    if audience:
+        emit_event(db, 'candidates', {}, audience)
+    return audience
+
+class Subscriber:
+    def __init__(self, association_id, maxsize):
+        self.association_id = association_id
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def wants(self, audience):
+        return audience is None or self.association_id in audience
+
+class EventBroker:
+    """In-process fan-out of the events table to /api/stream connections.
+
+    One thread per worker tails the table and copies each new event into
+    the bounded queue of every interested subscriber. A subscriber that
+    falls behind is dropped rather than buffered without limit; its client
+    reconnects with Last-Event-ID and catches up from the table.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_id = None
+        self._stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, association_id=None):
+        sub = Subscriber(association_id, self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def notify(self):
+        """Poll now instead of at the next interval, after a local commit."""
+        self._wake.set()
+
+    def poll(self, db):
+        rows = db.execute(
+            'SELECT id, kind, audience, payload FROM events WHERE id > ? ORDER BY id LIMIT 1000',
+            (self._last_id,)
+        ).fetchall()
+        for row in rows:
+            self.publish(row)
+            self._last_id = row['id']
+
+    def publish(self, row):
+        audience = set(json.loads(row['audience'])) if row['audience'] else None
+        event = (row['id'], row['kind'], row['payload'])
+        with self._lock:
+            self._stats['published'] += 1
+            for sub in list(self._subscribers):
+                if not sub.wants(audience):
+                    continue
+                try:
+                    sub.queue.put_nowait(event)
+                    self._stats['delivered'] += 1
+                except queue.Full:
+                    sub.closed = True
+                    self._subscribers.discard(sub)
+                    self._stats['dropped'] += 1
+
+    def run(self, interval, retention):
+        # Start from the current head: older events are only replayed on request
+        db = db_pool.acquire()
+        try:
+            self._last_id = db.execute('SELECT IFNULL(MAX(id), 0) FROM events').fetchone()[0]
+        finally:
+            db_pool.release(db)
+
+        prune_at = 0
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                db = db_pool.acquire()
+                try:
+                    self.poll(db)
+                    if time.monotonic() >= prune_at:
+                        prune_at = time.monotonic() + 60
+                        with db:
+                            db.execute(
+                                'DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?',
+                                (retention,)
+                            )
+                finally:
+                    db_pool.release(db)
+            except Exception:
+                app.logger.exception('Event feed poll failed')
+                time.sleep(interval)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._subscribers), last_id=self._last_id)
+
+event_broker = EventBroker(app.config['EVENT_QUEUE_SIZE'])
+
+def format_event(event_id, kind, data):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, kind, data)
+
+def ticket_digest(ticket):
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+def issue_stream_ticket(db, user_id):
+    """A new ticket for `user_id`, valid once within STREAM_TICKET_TTL.
+    Expired tickets are dropped on the way."""
+    now = time.time()
+    ticket = secrets.token_urlsafe(32)
+    db.execute('DELETE FROM stream_tickets WHERE expires_at < ?', (now,))
+    db.execute(
+        'INSERT INTO stream_tickets (digest, user_id, expires_at) VALUES (?, ?, ?)',
+        (ticket_digest(ticket), user_id, now + app.config['STREAM_TICKET_TTL'])
+    )
+    return ticket
+
+def redeem_stream_ticket(db, ticket):
+    """Use up a ticket and return its user id, or None if it is unknown,
+    already used or expired. Any worker process can redeem it."""
+    row = db.execute(
+        'DELETE FROM stream_tickets WHERE digest = ? RETURNING user_id, expires_at',
+        (ticket_digest(ticket),)
+    ).fetchone()
+    if row is None or row['expires_at'] < time.time():
+        return None
+    return row['user_id']
+
+# ============= APP FACTORY =============
+_db_lock = threading.Lock()
+_db_ready = False
+
+def ensure_database():
+    """Migrate and seed the database once per process tree. Forked workers
+    inherit the flag from the master that already did it."""
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_lock:
+        if not _db_ready:
+            with app.app_context():
+                init_db()
+            _db_ready = True
+
+def create_app(config=None, preload=False):
+    """Configure the app, prepare its database and return it.
+
+    `config` overrides app.config; database settings rebuild the connection
+    pool, other services keep the sizes read at import. With `preload` the
+    matching indexes are built now, so that workers forked afterwards share
+    them instead of building their own on their first request.
+    """
+    global db_pool, _db_ready
+    if config:
+        app.config.update(config)
+        if any(key.startswith('DB') or key == 'DATABASE' for key in config):
+            db_pool.close_all()
+            db_pool = make_db_pool(app.config)
+            _db_ready = False
+    ensure_database()
+    static_assets.build(app.config['STATIC_ROOT'])
+    if preload:
+        with app.app_context():
+            db = get_db()
+            match_engine.refresh(db)
+            candidate_engine.refresh(db)
+    return app
+
+def serve(host, port, workers, backlog=2048):
+    """Pre-forking server for production.
+
+    The master binds the listening socket, prepares the database and the
+    indexes, then forks `workers` processes that accept on the shared socket
+    with a threaded WSGI server each. Dead workers are replaced; SIGTERM or
+    SIGINT stops them all.
+    """
+    from werkzeug.serving import make_server
+
+    sock = socket.create_server((host, port), backlog=backlog)
+    create_app(preload=True)
+    # PASSWORD_HASH_WORKERS bounds the hash processes of the whole server
+    password_hasher.workers = max(1, app.config['PASSWORD_HASH_WORKERS'] // workers)
+    # No SQLite handle may cross a fork
+    db_pool.close_all()
+
+    children = {}
+    stopping = False
+
+    master = os.getpid()
+
+    def run_worker():
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        signal.signal(signal.SIGTERM,
+                      lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+
+        def watch_master():
+            # Exit with the master even if it was killed without warning
+            while os.getppid() == master:
+                time.sleep(1)
+            server.shutdown()
+
+        threading.Thread(target=watch_master, daemon=True).start()
+        try:
+            server.serve_forever()
+        finally:
+            password_hasher.shutdown()
+            os._exit(0)
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker()
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print('ImpactMatch listening on http://%s:%d with %d workers (master %d)' % (
+        host, sock.getsockname()[1], workers, os.getpid()), flush=True)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        app.logger.warning('Worker %d exited with status %d, restarting', pid, status)
+        if time.monotonic() - started < 1:
+            # Don't spin if workers die on startup
+            time.sleep(1)
+        spawn()
+    sock.close()
 
 # ============= API ROUTES =============
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.json
-    hashed_pw = hashlib.sha256(data['password'].encode()).hexdigest()
+    hashed_pw = password_hasher.hash(data['password'])
     
     with get_db() as db:
         try:
             db.execute('''
-                INSERT INTO users (email, password, user_type, name, city, age, job)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO users (email, password, user_type, name, city, age, job, lat, lon)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 data['email'], 
                 hashed_pw, 
@@ -319,7 +3514,7 @@ def register():
                 data.get('city', ''),
                 data.get('age', 0),
                 data.get('job', '')
-            ))
+            ) + (resolve_location(data.get('city')) or (None, None)))
             
             user_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
             
@@ -330,6 +3525,9 @@ def register():
                     VALUES (?, ?)
                 ''', (user_id, data.get('name', '')))
             
+            bump_data_version(db)
+            touch_profile(db, user_id)
+            
             token = jwt.encode({
                 'user_id': user_id, 
                 'exp': datetime.utcnow() + timedelta(days=7)
@@ -351,8 +3549,17 @@ def login():
     data = request.json
     with get_db() as db:
         user = db.execute('SELECT * FROM users WHERE email = ?', (data['email'],)).fetchone()
-        
-        if user and user['password'] == hashlib.sha256(data['password'].encode()).hexdigest():
+    
+    if user:
+        matches, needs_rehash = password_hasher.verify(data['password'], user['password'])
+        if matches:
+            if needs_rehash:
+                # Upgrade legacy or outdated hashes while we have the password
+                new_hash = password_hasher.hash(data['password'])
+                with get_db() as db:
+                    db.execute('UPDATE users SET password = ? WHERE id = ?', (new_hash, user['id']))
+                password_hasher.record_rehash()
+            
             token = jwt.encode({
                 'user_id': user['id'], 
                 'exp': datetime.utcnow() + timedelta(days=7)
@@ -371,6 +3578,8 @@ def login():
 
 @app.route('/api/profile/analyze', methods=['POST'])
 def analyze_profile():
+    """Queue the AI analysis of a citizen profile. Answers 202 with the
+    job; its result is the analysis, read from /api/jobs/<id>."""
     data = request.json
     
     profile_data = {
@@ -383,186 +3592,909 @@ def analyze_profile():
         'availability': data.get('availability', [])
     }
     
+    user_id = get_token_user_id()
+    return job_response('analyze_profile', {'profile': profile_data, 'user_id': user_id},
+                        user_id=user_id)
+
+@job_handler('analyze_profile')
+def run_profile_analysis(payload):
+    """Analyze a profile and save it, with its score, for the signed-in
+    citizen who sent it so matching can use it."""
+    profile_data = payload['profile']
+    user_id = payload['user_id']
     analysis = AIService.analyze_profile(profile_data)
-    return jsonify(analysis)
+    if user_id is None:
+        return analysis
 
-@app.route('/api/missions', methods=['GET'])
-def get_missions():
     with get_db() as db:
-        missions = db.execute('''
-            SELECT m.*, a.name as org_name, a.logo 
-            FROM missions m
-            LEFT JOIN associations a ON m.association_id = a.id
-            WHERE m.status = 'active'
-            ORDER BY m.created_at DESC
-        ''').fetchall()
-        
-        result = []
-        for m in missions:
-            # Calculate random score for demo
-            import random
-            score = random.randint(75, 98)
-            
-            tags = json.loads(m['tags']) if m['tags'] else [
+        updated = db.execute('''
+            UPDATE users SET name = ?, city = ?, age = ?, job = ?, skills = ?,
+                user_values = ?, availability = ?, profile_score = ?, lat = ?, lon = ?
+            WHERE id = ? AND user_type = 'citizen'
+        ''', (
+            profile_data['name'],
+            profile_data['city'],
+            profile_data['age'],
+            profile_data['job'],
+            json.dumps(profile_data['skills']),
+            json.dumps(profile_data['values']),
+            json.dumps(profile_data['availability']),
+            analysis['score']
+        ) + (resolve_location(profile_data['city']) or (None, None)) + (user_id,)).rowcount
+        if updated:
+            bump_data_version(db)
+            touch_profile(db, user_id)
+            audience = emit_candidate_event(db, {
+                'skills': json.dumps(profile_data['skills']),
+                'user_values': json.dumps(profile_data['values']),
+                'availability': json.dumps(profile_data['availability']),
+                'city': profile_data['city']
+            })
+            queue_candidate_stats(db, audience)
+    if updated:
+        event_broker.notify()
+        job_queue.notify()
+    return analysis
+
+def load_citizen(user):
+    if user is None:
+        user = {'skills': None, 'user_values': None, 'availability': None, 'city': None}
+    return citizen_features(user)
+
+# Response fields of /api/missions and the columns each one needs
+MISSION_FIELDS = {
+    'id': ['m.id'],
+    'org': ['a.name AS org_name'],
+    'title': ['m.title'],
+    'emoji': ['m.emoji'],
+    'score': [],
+    'impact': ['m.impact_description'],
+    'description': ['m.description'],
+    'tags': ['m.tags'],
+    'reasons': [],
+    'meta': ['m.location', 'm.commitment', 'm.urgent'],
+    'created_at': ['m.created_at']
+}
+DEFAULT_MISSION_FIELDS = ['id', 'org', 'title', 'emoji', 'score', 'impact', 'tags', 'reasons', 'meta']
+
+def encode_cursor(created_at, mission_id):
+    raw = json.dumps([created_at, mission_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, mission_id = json.loads(raw)
+        return str(created_at), int(mission_id)
+    except (ValueError, TypeError):
+        return None
+
+def mission_to_dict(m, fields, score, reasons):
+    out = {}
+    for field in fields:
+        if field == 'org':
+            out['org'] = m['org_name'] or 'Association'
+        elif field == 'emoji':
+            out['emoji'] = m['emoji'] or '🤝'
+        elif field == 'score':
+            out['score'] = score
+        elif field == 'impact':
+            out['impact'] = m['impact_description']
+        elif field == 'tags':
+            out['tags'] = json.loads(m['tags']) if m['tags'] else [
                 {'t': 'Compétence', 'c': 's'},
                 {'t': 'Bénévolat', 'c': 'v'},
                 {'t': 'Flexible', 'c': 't'}
             ]
-            
-            result.append({
-                'id': m['id'],
-                'org': m['org_name'] or 'Association',
-                'title': m['title'],
-                'emoji': m['emoji'] or '🤝',
-                'score': score,
-                'impact': m['impact_description'],
-                'tags': tags,
-                'reasons': [
-                    'Match IA détecté',
-                    'Profil compatible',
-                    'Disponibilités alignées'
-                ][:random.randint(2, 3)],
-                'meta': {
-                    'loc': m['location'] or 'À distance',
-                    'eng': m['commitment'] or 'Flexible',
-                    'urgent': bool(m['urgent'])
-                }
-            })
-        
-        return jsonify(result)
+        elif field == 'reasons':
+            out['reasons'] = reasons
+        elif field == 'meta':
+            out['meta'] = {
+                'loc': m['location'] or 'À distance',
+                'eng': m['commitment'] or 'Flexible',
+                'urgent': bool(m['urgent'])
+            }
+        else:
+            out[field] = m[field]
+    return out
+
+@app.route('/api/missions', methods=['GET'])
+@cached_get
+def get_missions():
+    """List active missions.
+
+    Ranked by relevance for the calling citizen by default. With
+    ?sort=recent (or a ?cursor=) the list is keyset-paginated on
+    (created_at, id) and the next page's cursor is sent in X-Next-Cursor.
+    ?fields= restricts the response to a comma-separated subset of fields.
+    ?near=<place>&radius_km= keeps on-site missions within the radius
+    (25 km by default); ?remote=1 keeps remote missions only.
+    Missions are served from the in-memory catalog snapshot.
+    """
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    cursor = request.args.get('cursor')
+    recent = cursor is not None or request.args.get('sort') == 'recent'
+
+    fields = [f for f in request.args.get('fields', '').split(',') if f in MISSION_FIELDS]
+    fields = list(dict.fromkeys(fields)) or DEFAULT_MISSION_FIELDS
+    needs_score = 'score' in fields or 'reasons' in fields
+
+    filters = parse_mission_filters(request.args)
+    try:
+        near = parse_near(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    position = None
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    with get_db() as db:
+        match_engine.refresh(db)
+        catalog = mission_catalog.refresh(db)
+        only = restrict_missions(db, filters, near)
+        citizen = load_citizen(current_user()) if needs_score else None
+
+    if recent:
+        page, more = catalog.page(limit, position, only)
+        scored = match_engine.score(citizen, [r.id for r in page]) if needs_score else {}
+        response = render_missions(page, fields, scored)
+        if more:
+            response.headers['X-Next-Cursor'] = encode_cursor(page[-1].created_at, page[-1].id)
+        return response
+
+    ranked = match_engine.rank(citizen or load_citizen(None), k=limit, only=only)
+    # A mission another request just pulled into match_engine may be newer than this snapshot
+    ranked = [entry for entry in ranked if entry[0] in catalog.records]
+    return render_missions(
+        [catalog.records[mission_id] for mission_id, _, _ in ranked],
+        fields,
+        {mission_id: (score, reasons) for mission_id, score, reasons in ranked}
+    )
+
+# Relative weight of title, description and impact_description in bm25()
+SEARCH_WEIGHTS = (10.0, 2.0, 4.0)
+SEARCH_FIELDS = ['id', 'org', 'title', 'emoji', 'impact', 'tags', 'meta']
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last
+    one as a prefix so results follow the user's typing. Words are quoted,
+    so FTS5 operators in the input are searched as plain text."""
+    words = fold_text(text).split()
+    words = [w for w in words if w not in STOPWORDS] or words
+    if not words:
+        return None
+    terms = ['"%s"' % w for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def render_snippet(raw):
+    """HTML-escape an FTS5 snippet, then turn its match markers into <mark>."""
+    return html.escape(raw).replace('\x02', '<mark>').replace('\x03', '</mark>')
+
+@app.route('/api/missions/search', methods=['GET'])
+@cached_get
+def search_missions():
+    """Full-text search over active missions, best matches first.
+
+    Ranked by BM25 with titles weighted highest; each result carries an
+    HTML snippet with the matched words in <mark>. Paginate with ?limit=
+    and ?offset=; X-Next-Offset is set while more results remain. The
+    term, ?remote= and ?near= filters of /api/missions apply.
+    """
+    query = fts_query(request.args.get('q', ''))
+    if query is None:
+        return jsonify({'error': 'Missing search query'}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    filters = parse_mission_filters(request.args)
+    try:
+        near = parse_near(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    columns = []
+    for field in SEARCH_FIELDS:
+        columns.extend(c for c in MISSION_FIELDS[field] if c not in columns)
+
+    with get_db() as db:
+        where = ["missions_fts MATCH ?", "m.status = 'active'"]
+        params = [query]
+        for sql, restriction in restriction_queries(filters, near):
+            where.append('missions_fts.rowid IN (%s)' % sql)
+            params.extend(restriction)
+        rows = db.execute('''
+            SELECT %s,
+                snippet(missions_fts, -1, char(2), char(3), '…', 12) AS snippet
+            FROM missions_fts
+            JOIN missions m ON m.id = missions_fts.rowid
+            LEFT JOIN associations a ON m.association_id = a.id
+            WHERE %s
+            ORDER BY bm25(missions_fts, %s), m.id
+            LIMIT ? OFFSET ?
+        ''' % (', '.join(columns), ' AND '.join(where), ', '.join(map(str, SEARCH_WEIGHTS))),
+            params + [limit + 1, offset]).fetchall()
+
+    results = []
+    for m in rows[:limit]:
+        result = mission_to_dict(m, SEARCH_FIELDS, MatchEngine.BASE, [])
+        result['snippet'] = render_snippet(m['snippet'])
+        results.append(result)
+    response = jsonify(results)
+    if len(rows) > limit:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response
 
 @app.route('/api/ai/generate-mission', methods=['POST'])
 def generate_mission():
+    """Queue the drafting of a mission from free text. Answers 202 with
+    the job; its result is the draft, read from /api/jobs/<id>."""
     data = request.json
-    user_input = data.get('text', '')
-    mission = AIService.generate_mission_from_text(user_input)
-    return jsonify(mission)
+    return job_response('generate_mission', {'text': data.get('text', '')})
+
+@job_handler('generate_mission')
+def run_mission_generation(payload):
+    return AIService.generate_mission_from_text(payload['text'])
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a queued job, with its result once done. ?wait=<seconds>
+    long-polls until the job finishes, up to JOB_MAX_WAIT."""
+    wait = max(0.0, min(request.args.get('wait', 0, type=float), app.config['JOB_MAX_WAIT']))
+    job = job_queue.wait(job_id, wait)
+    if job is None or job['user_id'] not in (None, get_token_user_id()):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+# Text fields of a mission payload and the missions column each one fills
+MISSION_TEXT_FIELDS = {
+    'title': 'title',
+    'emoji': 'emoji',
+    'description': 'description',
+    'impact': 'impact_description',
+    'location': 'location',
+    'commitment': 'commitment'
+}
+
+def mission_from_payload(data):
+    """Validate a mission payload and map it to missions columns.
+
+    Used for /api/missions/create bodies and /api/missions/bulk lines.
+    `skills` may hold plain strings or {t, c} tags, `tags` only tags.
+    Raises ValueError with a message suitable for the client.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    mission = {}
+    for key, column in MISSION_TEXT_FIELDS.items():
+        value = data.get(key)
+        if value is not None and not isinstance(value, str):
+            raise ValueError('%s must be a string' % key)
+        mission[column] = value
+
+    skills = data.get('skills') or []
+    tags = data.get('tags') or []
+    if not isinstance(skills, list) or not isinstance(tags, list):
+        raise ValueError('skills and tags must be lists')
+    skills = [{'t': s, 'c': 's'} if isinstance(s, str) else s for s in skills]
+    for tag in skills + tags:
+        if not isinstance(tag, dict) or not isinstance(tag.get('t'), str):
+            raise ValueError('Invalid tag %r' % (tag,))
+
+    mission['title'] = mission['title'] or 'Nouvelle mission'
+    mission['emoji'] = mission['emoji'] or '🤝'
+    mission['impact_description'] = mission['impact_description'] or ''
+    mission['commitment'] = mission['commitment'] or 'Flexible'
+    mission['skills_required'] = json.dumps(skills) if skills else None
+    mission['tags'] = json.dumps(tags)
+    mission['urgent'] = int(bool(data.get('urgent', False)))
+    return mission
+
+def get_association_id(db, user):
+    """Association id of a current_user() row, created if it doesn't exist."""
+    if user['association_id'] is not None:
+        return user['association_id']
+    cursor = db.execute('INSERT INTO associations (user_id, name) VALUES (?, ?)', (user['id'], user['name']))
+    return cursor.lastrowid
+
+def insert_missions(db, assoc_id, missions):
+    """Insert missions with their features and index terms; returns the ids.
+
+    Ids are allocated up front inside an immediate transaction so the whole
+    batch goes through executemany instead of one INSERT per row.
+    """
+    if not db.in_transaction:
+        db.execute('BEGIN IMMEDIATE')
+    first_id = db.execute('''
+        SELECT MAX(
+            IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'missions'), 0),
+            IFNULL((SELECT MAX(id) FROM missions), 0)
+        ) + 1
+    ''').fetchone()[0]
+
+    rows = []
+    terms = []
+    for mission_id, mission in enumerate(missions, first_id):
+        features = mission_features(mission)
+        geo = features['geo'] or (None, None)
+        rows.append((
+            mission_id,
+            assoc_id,
+            mission['title'],
+            mission['emoji'],
+            mission['description'],
+            mission['impact_description'],
+            mission['location'],
+            mission['commitment'],
+            mission['skills_required'],
+            mission['tags'],
+            mission['urgent'],
+            json.dumps(features),
+            estimate_people_reached(mission['impact_description']),
+            geo[0],
+            geo[1],
+            int(features['remote'])
+        ))
+        terms.extend((kind, term, mission_id) for kind, term in mission_terms(mission, features))
+
+    db.executemany('''
+        INSERT INTO missions (
+            id, association_id, title, emoji, description, impact_description,
+            location, commitment, skills_required, tags, urgent, features, people_reached,
+            lat, lon, remote
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    db.executemany(
+        'INSERT OR IGNORE INTO mission_terms (kind, term, mission_id) VALUES (?, ?, ?)',
+        terms
+    )
+    bump_data_version(db)
+    ids = [row[0] for row in rows]
+    emit_mission_events(db, ids)
+    queue_candidate_stats(db, [assoc_id])
+    return ids
 
 @app.route('/api/missions/create', methods=['POST'])
+@require_auth
 def create_mission():
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({'error': 'No token provided'}), 401
-    
     try:
-        token = auth_header.split(' ')[1]
-        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        user_id = data['user_id']
-    except:
-        return jsonify({'error': 'Invalid token'}), 401
+        mission = mission_from_payload(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    with get_db() as db:
+        assoc_id = get_association_id(db, current_user())
+        mission_id, = insert_missions(db, assoc_id, [mission])
+    event_broker.notify()
+    job_queue.notify()
+    # Swap the mission into this process's catalog now, not on the next read
+    mission_catalog.refresh(get_db())
     
-    mission_data = request.json
+    return jsonify({'success': True, 'id': mission_id})
+
+@app.route('/api/missions/bulk', methods=['POST'])
+@require_auth
+def bulk_import_missions():
+    """Import NDJSON missions (one create payload per line) for the caller's
+    association. Lines are validated one by one and inserted in chunked
+    transactions; invalid lines are reported and skipped."""
+    chunk_size = app.config['BULK_CHUNK_SIZE']
+    max_errors = app.config['BULK_MAX_ERRORS']
     
+    imported = 0
+    errors = []
+    error_count = 0
     with get_db() as db:
-        # Get association id
-        assoc = db.execute('SELECT id FROM associations WHERE user_id = ?', (user_id,)).fetchone()
-        if not assoc:
-            # Create association if doesn't exist
-            user = db.execute('SELECT name FROM users WHERE id = ?', (user_id,)).fetchone()
-            db.execute('INSERT INTO associations (user_id, name) VALUES (?, ?)', (user_id, user['name']))
-            assoc_id = db.execute('SELECT last_insert_rowid()').fetchone()[0]
-        else:
-            assoc_id = assoc['id']
+        assoc_id = get_association_id(db, current_user())
+        db.commit()
         
-        db.execute('''
-            INSERT INTO missions (
-                association_id, title, emoji, impact_description, 
-                commitment, urgent, tags
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            assoc_id,
-            mission_data.get('title', 'Nouvelle mission'),
-            mission_data.get('emoji', '🤝'),
-            mission_data.get('impact', ''),
-            mission_data.get('commitment', 'Flexible'),
-            0,
-            json.dumps(mission_data.get('tags', []))
-        ))
+        chunk = []
+        for line_no, line in enumerate(request.stream, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if not isinstance(data, dict) or not data.get('title'):
+                    raise ValueError('title is required')
+                chunk.append(mission_from_payload(data))
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < max_errors:
+                    errors.append({'line': line_no, 'error': str(e)})
+                continue
+            if len(chunk) >= chunk_size:
+                imported += len(insert_missions(db, assoc_id, chunk))
+                db.commit()
+                chunk = []
+        if chunk:
+            imported += len(insert_missions(db, assoc_id, chunk))
+    event_broker.notify()
+    job_queue.notify()
+    mission_catalog.refresh(get_db())
     
-    return jsonify({'success': True})
+    return jsonify({'imported': imported, 'error_count': error_count, 'errors': errors})
+
+@app.route('/api/missions/export', methods=['GET'])
+@require_auth
+def export_missions():
+    """Stream missions as NDJSON, in the format /api/missions/bulk reads:
+    the caller's association's missions in every status, or the active
+    catalog for callers without an association."""
+    chunk_size = app.config['BULK_CHUNK_SIZE']
+    assoc_id = current_user()['association_id']
+    if assoc_id is not None:
+        scope, scope_params = 'm.association_id = ?', (assoc_id,)
+    else:
+        scope, scope_params = "m.status = 'active'", ()
+    
+    def generate():
+        last_id = 0
+        while True:
+            rows = get_db().execute('''
+                SELECT m.*, a.name AS org_name
+                FROM missions m
+                LEFT JOIN associations a ON m.association_id = a.id
+                WHERE %s AND m.id > ?
+                ORDER BY m.id
+                LIMIT ?
+            ''' % scope, scope_params + (last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            lines = []
+            for m in rows:
+                lines.append(json.dumps({
+                    'id': m['id'],
+                    'association': m['org_name'],
+                    'title': m['title'],
+                    'emoji': m['emoji'],
+                    'description': m['description'],
+                    'impact': m['impact_description'],
+                    'location': m['location'],
+                    'commitment': m['commitment'],
+                    'skills': [t.get('t') for t in load_json_list(m['skills_required'])
+                               if isinstance(t, dict)],
+                    'tags': load_json_list(m['tags']),
+                    'urgent': bool(m['urgent']),
+                    'status': m['status'],
+                    'created_at': m['created_at']
+                }, ensure_ascii=False))
+            yield '\n'.join(lines) + '\n'
+            last_id = rows[-1]['id']
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def association_candidates(db, association_id, per_mission):
+    """The best citizens of each active mission of an association, as
+    (mission, features, (score, user_id, sm, vm, am)), best first."""
+    candidate_engine.refresh(db)
+    missions = db.execute('''
+        SELECT id, title, features FROM missions
+        WHERE association_id = ? AND status = 'active'
+        ORDER BY created_at DESC, id DESC
+    ''', (association_id,)).fetchall()
+    ranked = []
+    for m in missions:
+        features = json.loads(m['features'] or '{}')
+        for entry in candidate_engine.top(m['id'], features, per_mission):
+            ranked.append((m, features, entry))
+    ranked.sort(key=lambda item: item[2], reverse=True)
+    return ranked
+
+def candidate_statuses(db, user_ids):
+    """{(mission_id, user_id): status} of the reviewed candidates."""
+    marks = ','.join('?' * len(user_ids))
+    return {(r['mission_id'], r['user_id']): r['status'] for r in db.execute(
+        'SELECT mission_id, user_id, status FROM matches WHERE user_id IN (%s)' % marks,
+        user_ids
+    )}
 
 @app.route('/api/candidates', methods=['GET'])
+@require_auth
+@cached_get
 def get_candidates():
-    # Return sample candidates
-    candidates = [
-        {
-            'name': 'Amira Benali',
-            'age': 24,
-            'city': 'Tunis',
-            'job': 'Designer UX',
+    """Best citizens for each of the calling association's active missions."""
+    per_mission = max(1, min(request.args.get('limit', app.config['CANDIDATES_PER_MISSION'], type=int),
+                             CandidateEngine.K))
+    
+    with get_db() as db:
+        ranked = association_candidates(db, current_user()['association_id'], per_mission)
+        if not ranked:
+            return jsonify([])
+        
+        user_ids = list({entry[1] for _, _, entry in ranked})
+        # Looked up by id one at a time: with a long IN list the planner
+        # prefers scanning a small users table
+        users = {u['id']: u for u in db.execute('''
+            SELECT u.id, u.name, u.age, u.city, u.job, u.skills, u.user_values
+            FROM json_each(?) ids CROSS JOIN users u ON u.id = ids.value
+        ''', (json.dumps(user_ids),))}
+        statuses = candidate_statuses(db, user_ids)
+    
+    candidates = []
+    for m, features, (score, cand_id, sm, vm, am) in ranked:
+        u = users[cand_id]
+        reasons = MatchEngine.reasons(features, candidate_engine.citizen(cand_id))
+        status = statuses.get((m['id'], cand_id))
+        candidates.append({
+            'id': cand_id,
+            'name': u['name'] or 'Citoyen·ne',
+            'age': u['age'],
+            'city': u['city'],
+            'job': u['job'],
             'emoji': '🙋',
-            'score': 96,
-            'mission': 'Campagne comm.',
-            'skills': ['Design UX', 'Social Media'],
-            'values': ['🌱 Environnement'],
-            'sm': 95,
-            'vm': 98,
-            'am': 90,
-            'why': 'Compétences alignées à 100%, valeur "Environnement" partagée.',
-            'status': 'new'
-        },
-        {
-            'name': 'Karim Ouhabi',
-            'age': 28,
-            'city': 'Casablanca',
-            'job': 'Chef de projet',
-            'emoji': '👨',
-            'score': 88,
-            'mission': 'Atelier écoles',
-            'skills': ['Gestion projet', 'Formation'],
-            'values': ['📚 Éducation'],
-            'sm': 82,
-            'vm': 94,
-            'am': 88,
-            'why': 'Expérience formation détectée, disponible week-ends.',
-            'status': 'new'
-        },
-        {
-            'name': 'Sara Mansouri',
-            'age': 22,
-            'city': 'Tunis',
-            'job': 'Étudiante communication',
-            'emoji': '👩',
-            'score': 91,
-            'mission': 'Design contenus',
-            'skills': ['Communication', 'Créativité'],
-            'values': ['🎨 Culture'],
-            'sm': 89,
-            'vm': 96,
-            'am': 93,
-            'why': 'Profil créatif fort, compétences visuelles.',
-            'status': 'new'
-        }
-    ]
+            'score': score,
+            'mission': m['title'],
+            'mission_id': m['id'],
+            'skills': load_json_list(u['skills']),
+            'values': load_json_list(u['user_values']),
+            'sm': sm,
+            'vm': vm,
+            'am': am,
+            'why': ' · '.join(reasons) or 'Profil disponible pour cette mission.',
+            'status': 'validated' if status == 'accepted' else status or 'new'
+        })
     return jsonify(candidates)
 
 @app.route('/api/dashboard/stats', methods=['GET'])
+@require_auth
+@cached_get
 def get_dashboard_stats():
+    """One association_stats row. Candidate counters are written by the
+    candidate_stats job; reading an association never counted queues it."""
+    association_id = current_user()['association_id']
+    with get_db() as db:
+        stats = db.execute(
+            'SELECT * FROM association_stats WHERE association_id = ?', (association_id,)
+        ).fetchone()
+        uncounted = association_id is not None and (stats is None or stats['candidates_counted_at'] is None)
+        if uncounted:
+            queue_candidate_stats(db, [association_id])
+    if uncounted:
+        job_queue.notify()
+    
+    if not stats:
+        return jsonify({
+            'active_missions': 0,
+            'total_candidates': 0,
+            'new_candidates': 0,
+            'match_rate': 0,
+            'people_impacted': 0
+        })
+    
+    return jsonify({
+        'active_missions': stats['active_missions'],
+        'total_candidates': stats['total_candidates'],
+        'new_candidates': stats['new_candidates'],
+        'match_rate': stats['match_rate'],
+        'people_impacted': stats['people_impacted']
+    })
+
+@app.route('/api/stream/ticket', methods=['POST'])
+@require_auth
+def create_stream_ticket():
+    """Ticket for /api/stream?ticket=. EventSource cannot send the
+    Authorization header, and the bearer token must not end up in a URL,
+    so the client trades it here for a short-lived, single-use ticket."""
+    with get_db() as db:
+        ticket = issue_stream_ticket(db, current_user()['id'])
+    return jsonify({'ticket': ticket, 'expires_in': app.config['STREAM_TICKET_TTL']})
+
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    """Server-Sent Events feed of catalog changes.
+
+    Pushes 'missions' deltas to everyone and 'candidates' notices to the
+    associations concerned. EventSource cannot send headers, so callers
+    identify with ?ticket=, from POST /api/stream/ticket; without one the
+    feed is anonymous. Reconnecting clients send Last-Event-ID (or
+    ?last_event_id=) and get the events they missed replayed from the
+    feed, or a 'reset' event if those were already pruned.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    with get_db() as db:
+        user_id = get_token_user_id()
+        ticket = request.args.get('ticket')
+        if ticket:
+            user_id = redeem_stream_ticket(db, ticket)
+            db.commit()
+            if user_id is None:
+                return jsonify({'error': 'Invalid or expired ticket'}), 401
+
+        association_id = None
+        if user_id is not None:
+            row = db.execute(
+                'SELECT id FROM associations WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            association_id = row['id'] if row else None
+
+        # Subscribe before reading the backlog so nothing falls in between
+        sub = event_broker.subscribe(association_id)
+        # Separate subqueries so both use the rowid instead of one full scan
+        head, first = db.execute('''
+            SELECT IFNULL((SELECT MAX(id) FROM events), 0), (SELECT MIN(id) FROM events)
+        ''').fetchone()
+        backlog = []
+        reset = False
+        if last_id is not None:
+            backlog = db.execute('''
+                SELECT id, kind, audience, payload FROM events
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, app.config['EVENT_REPLAY_LIMIT'] + 1)).fetchall()
+            reset = (first is not None and last_id < first - 1) or \
+                len(backlog) > app.config['EVENT_REPLAY_LIMIT']
+
+    keepalive = app.config['EVENT_KEEPALIVE']
+
+    def generate():
+        sent = head
+        try:
+            yield 'retry: 3000\n\n'
+            if reset:
+                yield format_event(sent, 'reset', '{}')
+            elif last_id is None:
+                yield format_event(sent, 'ready', '{}')
+            else:
+                for row in backlog:
+                    audience = json.loads(row['audience']) if row['audience'] else None
+                    if sub.wants(audience):
+                        yield format_event(row['id'], row['kind'], row['payload'])
+                    sent = max(sent, row['id'])
+            while True:
+                try:
+                    event = sub.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    if sub.closed:
+                        return
+                    yield ': keepalive\n\n'
+                    continue
+                if event[0] > sent:
+                    sent = event[0]
+                    yield format_event(*event)
+        finally:
+            event_broker.unsubscribe(sub)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/health', methods=['GET'])
+def health():
     return jsonify({
-        'active_missions': 7,
-        'total_candidates': 24,
-        'new_candidates': 4,
-        'match_rate': 89,
-        'people_impacted': 1240
+        'status': 'ok',
+        'db_pool': db_pool.stats(),
+        'response_cache': response_cache.stats(),
+        'ai': ai_gateway.stats(),
+        'candidates': candidate_engine.stats(),
+        'password_hashing': password_hasher.stats(),
+        'token_cache': token_cache.stats(),
+        'events': event_broker.stats(),
+        'jobs': job_queue.stats(),
+        'catalog': mission_catalog.stats(),
+        'static': static_assets.stats()
     })
 
+def is_local_request():
+    """True for a direct request from this host. A request relayed by a
+    proxy on this host also comes from loopback, so forwarded ones are not
+    local."""
+    if request.headers.get('X-Forwarded-For') or request.headers.get('Forwarded'):
+        return False
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+def metrics_access(view):
+    """Guard internal endpoints with METRICS_TOKEN. Without a token they
+    only answer local requests, or anyone in debug mode."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = app.config['METRICS_TOKEN']
+        if expected:
+            supplied = request.headers.get('X-Metrics-Token') or request.args.get('token') or ''
+            allowed = hmac.compare_digest(supplied.encode(), expected.encode())
+        else:
+            allowed = app.debug or is_local_request()
+        if not allowed:
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/api/_metrics', methods=['GET'])
+@metrics_access
+def metrics():
+    """Prometheus text exposition of this worker process's metrics."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, stats in (
+        ('db_pool', db_pool.stats()),
+        ('response_cache', response_cache.stats()),
+        ('ai', ai_gateway.stats()),
+        ('candidates', candidate_engine.stats()),
+        ('password_hashing', password_hasher.stats()),
+        ('token_cache', token_cache.stats()),
+        ('events', event_broker.stats()),
+        ('jobs', job_queue.stats()),
+        ('catalog', mission_catalog.stats()),
+        ('static', static_assets.stats())
+    ):
+        lines.extend(render_gauges('impactmatch_' + name, stats))
+    return Response('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/_metrics/slow-queries', methods=['GET'])
+@metrics_access
+def slow_query_report():
+    return jsonify(list(reversed(slow_query_log)))
+
+@app.route('/api/_metrics/profiles', methods=['GET'])
+@metrics_access
+def profile_report():
+    return jsonify(list(reversed(profiler.profiles)))
+
 # Serve HTML frontend
+# ============= STATIC ASSETS =============
+# Files of the app directory that may be served; nothing else is, so the
+# database and the sources stay private. Their inline <style> and <script>
+# blocks are split out into content-hashed /assets/ files.
+STATIC_FILES = ('index.html',)
+# Precompressed variants, in order of preference when a client takes both
+STATIC_ENCODINGS = ('br', 'gzip')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+def compress(data, encoding):
+    """Compress at the highest level, or None when the codec is missing
+    (brotli is an optional dependency)."""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+class StaticAsset:
+    __slots__ = ('body', 'mimetype', 'cache_control', 'etag', 'variants')
+
+    def __init__(self, body, mimetype, cache_control):
+        self.body = body
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {}
+        for encoding in STATIC_ENCODINGS:
+            data = compress(body, encoding)
+            if data is not None and len(data) < len(body):
+                self.variants[encoding] = data
+
+def split_inline_assets(page, assets):
+    """Move a page's inline <style> and <script> blocks to content-hashed
+    files added to `assets`, and return the page linking to them."""
+    def extract(body, extension, mimetype):
+        data = body.encode('utf-8')
+        name = 'assets/%s.%s' % (hashlib.sha256(data).hexdigest()[:16], extension)
+        assets[name] = StaticAsset(data, mimetype, IMMUTABLE_CACHE)
+        return '/' + name
+
+    page = re.sub(
+        r'<style>(.*?)</style>',
+        lambda m: '<link rel="stylesheet" href="%s">' % extract(m.group(1), 'css', 'text/css'),
+        page, flags=re.S
+    )
+    return re.sub(
+        r'<script>(.*?)</script>',
+        lambda m: '<script src="%s"></script>' % extract(m.group(1), 'js', 'text/javascript'),
+        page, flags=re.S
+    )
+
+class StaticAssets:
+    """The frontend, built once into memory with its compressed variants.
+
+    Pages are revalidated on every visit (a 304 while unchanged); the
+    hashed files they link to change name with their content and are
+    cached for good. In debug mode a changed file triggers a rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assets = None
+        self._mtimes = None
+
+    def _sources(self, root):
+        return {name: os.path.join(root, name) for name in STATIC_FILES}
+
+    def build(self, root):
+        assets = {}
+        mtimes = {}
+        for name, path in self._sources(root).items():
+            mtimes[name] = os.stat(path).st_mtime_ns
+            with open(path, encoding='utf-8') as f:
+                page = f.read()
+            if name.endswith('.html'):
+                page = split_inline_assets(page, assets)
+            assets[name] = StaticAsset(page.encode('utf-8'), 'text/html', 'no-cache')
+        with self._lock:
+            self._assets = assets
+            self._mtimes = mtimes
+
+    def get(self, root, path):
+        if self._assets is None or (app.debug and self._changed(root)):
+            self.build(root)
+        return self._assets.get(path)
+
+    def _changed(self, root):
+        return any(os.stat(path).st_mtime_ns != self._mtimes.get(name)
+                   for name, path in self._sources(root).items())
+
+    def stats(self):
+        assets = self._assets or {}
+        return {
+            'assets': len(assets),
+            'bytes': sum(len(a.body) for a in assets.values()),
+            'compressed_bytes': sum(len(v) for a in assets.values() for v in a.variants.values())
+        }
+
+static_assets = StaticAssets()
+
+def send_asset(path):
+    asset = static_assets.get(app.config['STATIC_ROOT'], path)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    encoding = None
+    if 'Accept-Encoding' in request.headers:
+        encoding = request.accept_encodings.best_match(list(asset.variants))
+    response = app.response_class(asset.variants.get(encoding, asset.body), mimetype=asset.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Each encoding is a different representation and needs its own validator
+    response.set_etag(asset.etag + ('-' + encoding if encoding else ''))
+    response.headers['Cache-Control'] = asset.cache_control
+    return response.make_conditional(request)
+
 @app.route('/')
 def serve_frontend():
-    return send_from_directory('.', 'index.html')
+    return send_asset('index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('.', path)
+    return send_asset(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ImpactMatch API server')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('dev', help='debug server with reloader (default)')
+    serve_cmd = commands.add_parser('serve', help='pre-forking production server')
+    serve_cmd.add_argument('--host', default='0.0.0.0')
+    serve_cmd.add_argument('--port', type=int, default=5000)
+    serve_cmd.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    commands.add_parser('migrate', help='create or upgrade the database and exit')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.workers)
+    elif args.command == 'migrate':
+        create_app()
+        print('Database ready: %s' % app.config['DATABASE'])
+    else:
+        create_app()
+        print("=" * 50)
+        print("🚀 ImpactMatch API Server Starting...")
+        print("=" * 50)
+        print("📍 Server: http://localhost:5000")
+        print("📦 Database: %s (SQLite)" % app.config['DATABASE'])
+        print("👤 Demo Association: greenpeace@demo.org / demo123")
+        print("👤 Demo Citizen: amira@example.com / demo123")
+        print("=" * 50)
+        app.run(debug=True, port=5000)
 
 if __name__ == '__main__':
-    print("=" * 50)
-    print("🚀 ImpactMatch API Server Starting...")
-    print("=" * 50)
-    print("📍 Server: http://localhost:5000")
-    print("📦 Database: impactmatch.db (SQLite)")
-    print("👤 Demo Association: greenpeace@demo.org / demo123")
-    print("👤 Demo Citizen: amira@example.com / demo123")
-    print("=" * 50)
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    main()
@@ -0,0 +1,670 @@
+"""Load benchmark for every route of app.py.
+
+Builds a synthetic database, drives each route through the Flask test
+client and through a real threaded WSGI server, and reports throughput and
+p50/p95/p99 latency per endpoint:
+
+    python bench.py
+    python bench.py --save-baseline
+    python bench.py --baseline bench_baseline.json --tolerance 0.5
+
+A run exits non-zero when a route answered with an unexpected status.
+It is also compared with bench_baseline.json next to this file, but only
+as advice: the committed numbers come from another machine and another
+moment, and run-to-run noise there can exceed the tolerance. Regressions
+fail the run with an explicit --baseline or with --strict, which is
+meant for a baseline recorded on the same machine with --save-baseline
+(optionally followed by a path).
+"""
+import argparse
+import ast
+import http.client
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# ============= SYNTHETIC DATA =============
+SKILLS = [
+    'Design UX', 'Dev Web', 'Python', 'Social Media', 'Photographie', 'Comptabilité',
+    'Enseignement', 'Mentorat', 'Cuisine', 'Traduction', 'Juridique', 'Marketing',
+    'Logistique', 'Animation', 'Premiers secours', 'Vidéo', 'Rédaction', 'Data'
+]
+VALUES = [
+    'Environnement', 'Éducation', 'Santé', 'Numérique', 'Solidarité', 'Culture',
+    'Égalité', 'Animaux', 'Sport', 'Climat'
+]
+CITIES = ['Tunis', 'Sfax', 'Sousse', 'Bizerte', 'Casablanca', 'Rabat', 'Marrakech', 'Fès', 'Tanger']
+AVAILABILITY = ['Lundi soir', 'Mercredi après-midi', 'Week-end', 'Samedi matin', 'À distance', 'Vacances']
+COMMITMENTS = ['2h/semaine', '4h/mois', '8h/mois', '1 soir/sem', '20h/mois', 'Flexible']
+AUDIENCES = ['jeunes', 'enfants', 'familles', 'élèves', 'personnes']
+EMOJIS = ['🌱', '📚', '💻', '🏥', '🤝', '🎨', '⚽', '🐾']
+TITLES = [
+    'Mentor {skill} pour ados', 'Atelier {skill} solidaire', 'Campagne {value}',
+    'Soutien {skill} aux associations', 'Sensibilisation {value} à {city}'
+]
+
+def mission_payload(rng):
+    skill = rng.choice(SKILLS)
+    value = rng.choice(VALUES)
+    city = rng.choice(CITIES)
+    return {
+        'title': rng.choice(TITLES).format(skill=skill, value=value, city=city),
+        'emoji': rng.choice(EMOJIS),
+        'description': 'Mission %s autour de %s à %s.' % (value.lower(), skill, city),
+        'impact': 'Accompagner %d %s (%s)' % (rng.randint(5, 500), rng.choice(AUDIENCES), value),
+        'location': city if rng.random() < 0.8 else 'À distance',
+        'commitment': rng.choice(COMMITMENTS),
+        'skills': rng.sample(SKILLS, rng.randint(1, 4)),
+        'tags': [{'t': value, 'c': 'v'}, {'t': rng.choice(COMMITMENTS), 'c': 't'}],
+        'urgent': rng.random() < 0.15
+    }
+
+def build_database(app_module, users, associations, missions, seed):
+    """Fill the app's database with synthetic rows; returns the ids used by
+    the scenarios."""
+    A = app_module
+    rng = random.Random(seed)
+    password = A.password_hasher.hash('bench', in_process=True)
+
+    with A.app.app_context():
+        with A.get_db() as db:
+            db.executemany('''
+                INSERT INTO users (email, password, user_type, name, city, age, job,
+                                   skills, user_values, availability, profile_score)
+                VALUES (?, ?, 'citizen', ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                'citizen%d@bench.test' % i, password, 'Citoyen %d' % i,
+                rng.choice(CITIES), rng.randint(16, 70), rng.choice(SKILLS),
+                json.dumps(rng.sample(SKILLS, rng.randint(1, 5)), ensure_ascii=False),
+                json.dumps(rng.sample(VALUES, rng.randint(1, 3)), ensure_ascii=False),
+                json.dumps(rng.sample(AVAILABILITY, rng.randint(0, 3)), ensure_ascii=False),
+                rng.randint(40, 100)
+            ) for i in range(users)])
+
+            assoc_ids = []
+            for i in range(associations):
+                user_id = db.execute('''
+                    INSERT INTO users (email, password, user_type, name, city)
+                    VALUES (?, ?, 'association', ?, ?)
+                ''', ('asso%d@bench.test' % i, password, 'Association %d' % i,
+                      rng.choice(CITIES))).lastrowid
+                assoc_ids.append(db.execute(
+                    'INSERT INTO associations (user_id, name) VALUES (?, ?)',
+                    (user_id, 'Association %d' % i)
+                ).lastrowid)
+            A.bump_data_version(db)
+
+        chunk = A.app.config['BULK_CHUNK_SIZE']
+        for start in range(0, missions, chunk):
+            batch = [A.mission_from_payload(mission_payload(rng))
+                     for _ in range(min(chunk, missions - start))]
+            by_assoc = {}
+            for mission in batch:
+                by_assoc.setdefault(rng.choice(assoc_ids), []).append(mission)
+            with A.get_db() as db:
+                for assoc_id, group in by_assoc.items():
+                    A.insert_missions(db, assoc_id, group)
+
+        with A.get_db() as db:
+            citizen_ids = [r[0] for r in db.execute(
+                "SELECT id FROM users WHERE user_type = 'citizen' AND email LIKE '%@bench.test'")]
+            mission_ids = [r[0] for r in db.execute('SELECT id FROM missions')]
+            db.executemany(
+                'INSERT INTO matches (mission_id, user_id, score, status) VALUES (?, ?, ?, ?)',
+                [(rng.choice(mission_ids), rng.choice(citizen_ids), rng.randint(40, 100),
+                  rng.choice(['pending', 'pending', 'accepted', 'rejected']))
+                 for _ in range(min(len(citizen_ids) * 2, 50000))]
+            )
+            asso_user_ids = [r[0] for r in db.execute(
+                "SELECT user_id FROM associations WHERE name LIKE 'Association %'")]
+
+    return {'citizens': citizen_ids, 'associations': asso_user_ids}
+
+# ============= SCENARIOS =============
+def make_token(app_module, user_id):
+    return jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(days=1)},
+                      app_module.app.config['SECRET_KEY'], algorithm='HS256')
+
+def make_scenarios(app_module, ids, token_pool, seed):
+    """Return (name, weight, expected status, request factory) per endpoint.
+
+    A factory returns (method, path, headers, body, stream) for one call;
+    `stream` requests are timed to their first chunk and then closed.
+    """
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    counter = itertools.count()
+    citizens = [make_token(app_module, i) for i in ids['citizens'][:token_pool]]
+    # Starts after every row, so each request scans one page of the index
+    first_page_cursor = app_module.encode_cursor('9999-12-31 23:59:59', 2 ** 62)
+    assos = [make_token(app_module, i) for i in ids['associations'][:token_pool]]
+
+    def pick(seq):
+        with rng_lock:
+            return rng.choice(seq)
+
+    def auth(pool):
+        return {'Authorization': 'Bearer ' + pick(pool)}
+
+    def post_json(path, body, headers=None):
+        return ('POST', path, dict(headers or {}, **{'Content-Type': 'application/json'}),
+                json.dumps(body).encode(), False)
+
+    def get(path, headers=None, stream=False):
+        return ('GET', path, headers or {}, None, stream)
+
+    def bulk():
+        with rng_lock:
+            lines = [json.dumps(mission_payload(rng)) for _ in range(20)]
+        return ('POST', '/api/missions/bulk',
+                dict(auth(assos), **{'Content-Type': 'application/x-ndjson'}),
+                '\n'.join(lines).encode(), False)
+
+    def create():
+        with rng_lock:
+            payload = mission_payload(rng)
+        return post_json('/api/missions/create', payload, auth(assos))
+
+    def analyze():
+        with rng_lock:
+            profile = {
+                'name': 'Bench', 'city': rng.choice(CITIES), 'age': 30, 'job': 'Dev',
+                'skills': rng.sample(SKILLS, 3), 'values': rng.sample(VALUES, 2),
+                'availability': rng.sample(AVAILABILITY, 2)
+            }
+        return post_json('/api/profile/analyze', profile, auth(citizens))
+
+    return [
+        ('health', 1, 200, lambda: get('/api/health')),
+        ('frontend', 1, 200, lambda: get('/')),
+        ('missions_anonymous', 1, 200, lambda: get('/api/missions')),
+        ('missions_ranked', 1, 200, lambda: get('/api/missions', auth(citizens))),
+        ('missions_filtered', 1, 200,
+         lambda: get('/api/missions?skill=%s&city=%s' % (pick(['python', 'design', 'mentorat']),
+                                                         pick(['tunis', 'sfax', 'rabat'])),
+                     auth(citizens))),
+        ('missions_recent', 1, 200,
+         lambda: get('/api/missions?sort=recent&limit=50&fields=id,title,org', auth(citizens))),
+        ('missions_recent_page', 0.5, 200,
+         lambda: get('/api/missions?limit=50&cursor=' + first_page_cursor, auth(citizens))),
+        ('missions_search', 1, 200,
+         lambda: get('/api/missions/search?' + urllib.parse.urlencode(
+             {'q': pick(['mentor', 'campagne climat', 'atel', 'sensibilisation sfax'])}))),
+        ('missions_near', 1, 200,
+         lambda: get('/api/missions?' + urllib.parse.urlencode({
+             'near': pick(['la marsa', 'ariana', 'sale', 'sousse']),
+             'radius_km': pick([5, 25, 80])
+         }), auth(citizens))),
+        ('ai_generate_mission', 1, 202,
+         lambda: post_json('/api/ai/generate-mission',
+                           {'text': 'Besoin de %s pour %s' % (pick(SKILLS), pick(VALUES))})),
+        ('profile_analyze', 0.5, 202, analyze),
+        ('login', 0.1, 200,
+         lambda: post_json('/api/auth/login', {'email': 'citizen%d@bench.test' % pick(range(min(token_pool, len(ids['citizens'])))),
+                                               'password': 'bench'})),
+        ('register', 0.1, 200,
+         lambda: post_json('/api/auth/register', {
+             'email': 'new%d-%d@bench.test' % (os.getpid(), next(counter)),
+             'password': 'bench', 'userType': 'citizen'})),
+        ('missions_create', 0.5, 200, create),
+        ('missions_bulk', 0.1, 200, bulk),
+        ('missions_export', 0.05, 200, lambda: get('/api/missions/export', auth(assos))),
+        ('missions_export_active', 0.05, 200, lambda: get('/api/missions/export', auth(citizens))),
+        ('candidates', 1, 200, lambda: get('/api/candidates', auth(assos))),
+        ('dashboard_stats', 1, 200, lambda: get('/api/dashboard/stats', auth(assos))),
+        ('stream_connect', 0.2, 200, lambda: get('/api/stream', stream=True)),
+        ('stream_ticket', 0.2, 200, lambda: post_json('/api/stream/ticket', {}, auth(assos))),
+        ('metrics', 0.2, 200, lambda: get('/api/_metrics')),
+        ('metrics_slow_queries', 0.1, 200, lambda: get('/api/_metrics/slow-queries')),
+        ('metrics_profiles', 0.1, 200, lambda: get('/api/_metrics/profiles')),
+    ]
+
+# ============= RUNNERS =============
+def call_client(client, method, path, headers, body, stream):
+    response = client.open(path, method=method, headers=headers, data=body, buffered=not stream)
+    if stream:
+        next(iter(response.response))
+    else:
+        response.get_data()
+    response.close()
+    return response.status_code
+
+def call_server(port, method, path, headers, body, stream):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        if stream:
+            response.fp.readline()
+        else:
+            response.read()
+        return response.status
+    finally:
+        conn.close()
+
+def percentile(sorted_ms, p):
+    return sorted_ms[max(0, min(len(sorted_ms) - 1, math.ceil(p / 100 * len(sorted_ms)) - 1))]
+
+def summarize(latencies, errors, wall):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'mean': round(sum(latencies) / len(latencies), 3),
+        'p50': round(percentile(latencies, 50), 3),
+        'p95': round(percentile(latencies, 95), 3),
+        'p99': round(percentile(latencies, 99), 3)
+    }
+
+def run_scenario(call, factory, expected, count, concurrency, warmup):
+    for _ in range(warmup):
+        call(*factory())
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(_):
+        request = factory()
+        started = time.perf_counter()
+        status = call(*request)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if status != expected:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(count):
+            one(i)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(count)))
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+def run_mode(mode, app_module, scenarios, args):
+    from werkzeug.serving import make_server
+
+    server = None
+    if mode == 'client':
+        client = app_module.app.test_client()
+        call = lambda *r: call_client(client, *r)
+        concurrency = 1
+    else:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        call = lambda *r: call_server(server.server_port, *r)
+        concurrency = args.concurrency
+
+    results = {}
+    try:
+        for name, weight, expected, factory in scenarios:
+            if args.only and name not in args.only:
+                continue
+            count = max(1, int(args.requests * weight))
+            results[name] = run_scenario(call, factory, expected, count, concurrency,
+                                         warmup=min(args.warmup, count))
+            r = results[name]
+            print('%-8s %-22s %6d req %8.1f req/s  p50 %8.2f  p95 %8.2f  p99 %8.2f ms%s' % (
+                mode, name, r['requests'], r['rps'], r['p50'], r['p95'], r['p99'],
+                '  %d errors' % r['errors'] if r['errors'] else ''))
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+# ============= QUERY PLANS =============
+PLAN_SKIP = ('PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'CREATE', 'ALTER', 'ANALYZE')
+# Scans that are the point of the statement, by normalized SQL prefix
+EXPECTED_SCANS = {
+    'SELECT MAX( IFNULL((SELECT seq FROM sqlite_sequence': 'one row per AUTOINCREMENT table',
+    'SELECT COUNT(*) FROM ( SELECT a.id,': 'reconciliation compares every association',
+}
+SQL_LITERAL = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\s')
+# Stand-ins for the %s a statement template is formatted with: a
+# placeholder list, then a VALUES list of pairs
+TEMPLATE_FILLERS = ('?, ?', '(?, ?), (?, ?)')
+
+class SQLLiterals(ast.NodeVisitor):
+    """Collects the SQL string literals of a module with the function
+    that holds each one."""
+
+    def __init__(self):
+        self.scope = ['(module)']
+        self.found = []
+
+    def visit_FunctionDef(self, node):
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, str) and SQL_LITERAL.match(node.value):
+            self.found.append((self.scope[-1], node.value))
+
+def source_statements(app_module):
+    with open(app_module.__file__, encoding='utf-8') as f:
+        visitor = SQLLiterals()
+        visitor.visit(ast.parse(f.read()))
+    # Migrations and the derived data refresh run once, over whole tables by design
+    return [(scope, sql) for scope, sql in visitor.found
+            if not scope.startswith('migrate_') and scope != 'refresh_derived_data']
+
+def null_params(sql):
+    names = re.findall(r'(?<!:):([A-Za-z_]\w*)', sql)
+    return dict.fromkeys(names) if names else [None] * sql.count('?')
+
+def cte_names(sql):
+    return set(re.findall(r'(?:\bWITH|,)\s*(\w+)\s*(?:\([^()]*\))?\s+AS\s*\(', sql, re.I))
+
+def is_full_scan(detail, ctes=()):
+    return (detail.startswith('SCAN ') and ' USING ' not in detail
+            and detail[5:].split(' ', 1)[0] not in ctes
+            and 'CONSTANT ROW' not in detail and 'VALUES CLAUSE' not in detail
+            and 'VIRTUAL TABLE' not in detail
+            and not detail.startswith('SCAN ('))
+
+def check_plans(app_module, scenarios):
+    """Run every scenario once and EXPLAIN each distinct statement the
+    routes and background workers issued, then every SQL literal of app.py
+    that none of them ran (with NULL parameters). Returns the statements
+    that scan a whole table."""
+    seen = {}
+
+    def observe(route, sql, params, many):
+        # Statements outside a request come from the event feed and job workers
+        route = route or '(background)'
+        key = app_module.normalize_sql(sql)
+        if key.split(' ', 1)[0].upper() in PLAN_SKIP or key in seen:
+            return
+        if many:
+            if not params:
+                return
+            params = params[0]
+        seen[key] = (route, sql, params)
+
+    app_module.query_observer = observe
+    client = app_module.app.test_client()
+    try:
+        for name, weight, expected, factory in scenarios:
+            call_client(client, *factory())
+        # Sweeps the workers run only every few minutes
+        with app_module.app.app_context():
+            db = app_module.get_db()
+            app_module.reconcile_association_stats(db)
+            app_module.job_queue.maintain(db)
+    finally:
+        app_module.query_observer = None
+    ran = len(seen)
+
+    problems = []
+    unexplained = []
+    with app_module.app.app_context():
+        db = app_module.get_db()
+        for scope, literal in source_statements(app_module):
+            for filler in TEMPLATE_FILLERS if '%s' in literal else [None]:
+                sql = literal.replace('%s', filler) if filler else literal
+                key = app_module.normalize_sql(sql)
+                try:
+                    db.execute('EXPLAIN QUERY PLAN ' + sql, null_params(sql)).fetchall()
+                except app_module.sqlite3.Error:
+                    continue
+                seen.setdefault(key, ('app.py:' + scope, sql, null_params(sql)))
+                break
+            else:
+                # A template some scenario already ran in its final form
+                head = app_module.normalize_sql(literal.split('%s', 1)[0])
+                if not any(key.startswith(head) for key in seen):
+                    unexplained.append('app.py:%s: %s' % (scope, app_module.normalize_sql(literal)))
+
+        for key, (route, sql, params) in sorted(seen.items()):
+            plan = db.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            scans = [row[3] for row in plan if is_full_scan(row[3], cte_names(sql))]
+            allowed = next((reason for prefix, reason in EXPECTED_SCANS.items()
+                            if key.startswith(prefix)), None)
+            status = 'ok'
+            if scans and allowed:
+                status = 'scan allowed: ' + allowed
+            elif scans:
+                status = 'FULL SCAN: ' + '; '.join(scans)
+                problems.append('%s: %s (%s)' % (route, key, '; '.join(scans)))
+            print('%-28.28s %-70.70s %s' % (route, key, status))
+    for statement in unexplained:
+        print('not explained: ' + statement)
+    print('%d statements checked (%d run by the scenarios, %d more from app.py), '
+          '%d not explained, %d full table scans' % (
+              len(seen), ran, len(seen) - ran, len(unexplained), len(problems)))
+    return problems
+
+# ============= TEXT RULES =============
+# The if/elif chains the keyword tables of app.py replaced, frozen as the
+# reference: a table change that alters an output must update this copy
+LEGACY_MISSION_RULES = [
+    ('design', ['design', 'graphiste', 'visuel', 'créatif']),
+    ('communication', ['communica', 'réseaux', 'social', 'media', 'content']),
+    ('tech', ['code', 'dev', 'programmation', 'informatique']),
+    ('education', ['atelier', 'formation', 'enseigner', 'éduc'])
+]
+LEGACY_VALUE_RULES = [
+    ('environnement', ['environ']),
+    ('education', ['éduc', 'educ']),
+    ('sante', ['santé']),
+    ('justice sociale', ['justice']),
+    ('culture', ['culture']),
+    ('numerique', ['numéri'])
+]
+LEGACY_DOMAIN_RULES = [
+    ('environnement', ['environ', 'ocean', 'climat', 'ecolo', 'plage', 'nature', 'dechet']),
+    ('education', ['educ', 'ecole', 'enfant', 'jeune', 'ados', 'pedagog', 'formation', 'mentor', 'atelier']),
+    ('sante', ['sante', 'medic', 'soin', 'hopital']),
+    ('justice sociale', ['justice', 'droit', 'inclusion', 'egalite', 'refugie']),
+    ('culture', ['culture', 'art', 'musique', 'patrimoine', 'theatre']),
+    ('numerique', ['numeri', 'digital', 'informatique', 'code', 'dev web', 'programmation'])
+]
+# Inputs whose old outputs were reported as changed in review
+RULE_REGRESSIONS = [
+    'Graphiste pour réseaux sociaux et social media',
+    'atelier de formation pour apprendre à coder',
+    'Besoin de multimedia',
+    "Droits de l'enfant"
+]
+
+def legacy_matches(rules, text):
+    return [name for name, words in rules if any(w in text for w in words)]
+
+def rule_samples(app_module, seed):
+    """Seed missions, the profile form chips and the synthetic bench texts."""
+    samples = list(RULE_REGRESSIONS)
+    for mission in app_module.DEMO_MISSIONS:
+        samples.append(mission['title'])
+        samples.append(mission['impact'])
+        samples.extend(tag['t'] for tag in mission['skills'] + mission['tags'])
+    with open(os.path.join(os.path.dirname(os.path.abspath(app_module.__file__)), 'index.html')) as f:
+        for chips in re.findall(r"const (?:skills|vals) = (\[.*?\]);", f.read()):
+            samples.extend(ast.literal_eval(chips))
+    samples.extend(SKILLS + VALUES)
+    samples.extend('Besoin de %s pour %s' % (skill, value) for skill in SKILLS for value in VALUES)
+    rng = random.Random(seed)
+    for _ in range(500):
+        mission = mission_payload(rng)
+        samples.append(' '.join([mission['title'], mission['description'], mission['impact']]))
+    return list(dict.fromkeys(samples))
+
+def check_rules(app_module, seed):
+    """Compare the keyword classifiers of app.py with the legacy chains on
+    every sample text and return the differences."""
+    A = app_module
+    problems = []
+    samples = rule_samples(app_module, seed)
+    for text in samples:
+        legacy = (legacy_matches(LEGACY_MISSION_RULES, text.lower())[:1] or [None])[0]
+        if A.MISSION_CLASSIFIER.best(text) != legacy:
+            problems.append('mission template %r: %s != %s' % (text, A.MISSION_CLASSIFIER.best(text), legacy))
+        legacy = (legacy_matches(LEGACY_VALUE_RULES, text.lower())[:1] or [None])[0]
+        if A.VALUE_DOMAIN_CLASSIFIER.best(text) != legacy:
+            problems.append('value domain %r: %s != %s' % (text, A.VALUE_DOMAIN_CLASSIFIER.best(text), legacy))
+        legacy = legacy_matches(LEGACY_DOMAIN_RULES, A.fold_text(text))
+        if A.detect_domains(text) != legacy:
+            problems.append('domains %r: %s != %s' % (text, A.detect_domains(text), legacy))
+    print('%d texts checked, %d differences (%s)' % (
+        len(samples), len(problems),
+        'legacy matching' if A.app.config['RULES_LEGACY_MATCHING'] else 'accent folding'))
+    return problems
+
+# ============= BASELINE =============
+def unexpected_statuses(results):
+    return ['%s %s: %d unexpected statuses' % (mode, name, current['errors'])
+            for mode, endpoints in results.items()
+            for name, current in endpoints.items() if current['errors']]
+
+def compare(results, baseline, tolerance, slack_ms):
+    """Return a list of human-readable regressions against a baseline."""
+    problems = []
+    for mode, endpoints in results.items():
+        for name, current in endpoints.items():
+            base = baseline.get('results', {}).get(mode, {}).get(name)
+            if base is None:
+                continue
+            for metric in ('p50', 'p95', 'p99'):
+                limit = base[metric] * (1 + tolerance) + slack_ms
+                if current[metric] > limit:
+                    problems.append('%s %s: %s %.2fms > %.2fms (baseline %.2fms)' % (
+                        mode, name, metric, current[metric], limit, base[metric]))
+            floor = base['rps'] * (1 - tolerance)
+            if current['rps'] < floor:
+                problems.append('%s %s: %.1f req/s < %.1f req/s (baseline %.1f)' % (
+                    mode, name, current['rps'], floor, base['rps']))
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=2000, help='synthetic citizens')
+    parser.add_argument('--associations', type=int, default=100)
+    parser.add_argument('--missions', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint (scaled by weight)')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads against the WSGI server')
+    parser.add_argument('--tokens', type=int, default=50, help='distinct callers per role')
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both')
+    parser.add_argument('--only', nargs='*', help='endpoint names to run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='database path (default: a temporary file)')
+    parser.add_argument('--baseline',
+                        help='baseline JSON whose regressions fail the run, or "none" '
+                             '(default: advisory comparison with %s)' % DEFAULT_BASELINE)
+    parser.add_argument('--strict', action='store_true',
+                        help='fail on regressions against the default baseline too')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='write this run as a baseline JSON (default path: %(const)s)')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--slack-ms', type=float, default=1.0, help='absolute latency slack per metric')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='EXPLAIN every statement of app.py and fail on full table scans')
+    parser.add_argument('--check-rules', action='store_true',
+                        help='compare the keyword rules with the if/elif chains they replaced')
+    args = parser.parse_args(argv)
+
+    if args.check_rules:
+        import app as app_module
+        problems = check_rules(app_module, args.seed)
+        for problem in problems:
+            print('DIFFERENCE ' + problem)
+        return 1 if problems else 0
+
+    workdir = None
+    if args.db is None:
+        workdir = tempfile.TemporaryDirectory(prefix='impactmatch-bench-')
+        args.db = os.path.join(workdir.name, 'bench.db')
+    import app as app_module
+    app_module.create_app({'DATABASE': args.db})
+
+    started = time.perf_counter()
+    ids = build_database(app_module, args.users, args.associations, args.missions, args.seed)
+    print('Built %d citizens, %d associations, %d missions in %.1fs' % (
+        args.users, args.associations, args.missions, time.perf_counter() - started))
+
+    scenarios = make_scenarios(app_module, ids, args.tokens, args.seed)
+    covered = {factory()[1].split('?')[0] for _, _, _, factory in scenarios}
+    for rule in app_module.app.url_map.iter_rules():
+        if rule.endpoint != 'static' and '<' not in rule.rule and rule.rule not in covered:
+            print('warning: %s has no benchmark scenario' % rule.rule)
+
+    if args.check_plans:
+        with app_module.app.app_context():
+            app_module.get_db().execute('ANALYZE')
+        problems = check_plans(app_module, scenarios)
+        if workdir is not None:
+            app_module.db_pool.close_all()
+            workdir.cleanup()
+        return 1 if problems else 0
+
+    modes = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    results = {mode: run_mode(mode, app_module, scenarios, args) for mode in modes}
+
+    report = {
+        'dataset': {'users': args.users, 'associations': args.associations, 'missions': args.missions},
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'machine': {'cpus': os.cpu_count(), 'python': platform.python_version()},
+        'results': results
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Saved baseline to %s' % args.save_baseline)
+
+    errors = unexpected_statuses(results)
+    for error in errors:
+        print('ERROR ' + error)
+    status = 1 if errors else 0
+    strict = args.strict or args.baseline is not None
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if baseline_path == 'none' or args.save_baseline:
+        pass
+    elif not os.path.exists(baseline_path):
+        print('No baseline at %s; record one with --save-baseline' % baseline_path)
+    else:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('dataset') != report['dataset']:
+            print('warning: baseline dataset %s differs from this run %s' % (
+                baseline.get('dataset'), report['dataset']))
+        if baseline.get('machine') != report['machine']:
+            print('warning: baseline recorded on %s, this run on %s' % (
+                baseline.get('machine'), report['machine']))
+        problems = compare(results, baseline, args.tolerance, args.slack_ms)
+        for problem in problems:
+            print(('REGRESSION ' if strict else 'warning: slower ') + problem)
+        print('%d regressions against %s%s' % (
+            len(problems), baseline_path, '' if strict else ' (advisory, see --strict)'))
+        if strict and problems:
+            status = 1
+
+    if workdir is not None:
+        app_module.db_pool.close_all()
+        workdir.cleanup()
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())